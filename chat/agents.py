@@ -4,5 +4,14 @@ from __future__ import annotations
 
 from llmling_agent import AgentPool
 
+from chat import settings
+from chat.warmup import AgentWarmPool
+
 
 pool = AgentPool[None]("chat/agents.yml")
+warm_pool = AgentWarmPool(
+    pool,
+    instances=settings.WARMUP_AGENT_INSTANCES,
+    max_instances=settings.WARMUP_AGENT_MAX_INSTANCES,
+    ping_interval=settings.WARMUP_PING_INTERVAL,
+)
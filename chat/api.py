@@ -0,0 +1,158 @@
+"""HTTP endpoints mounted on the Reflex backend."""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+from typing import TYPE_CHECKING
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from chat import settings
+from chat.documents import doc_name, get_index
+from chat.generation import GenerationRequest, HistoryItem, generate
+from chat.models import UIMessage
+from chat.rendering import render_markdown
+from chat.storage import store
+from chat.transfer import (
+    MEDIA_TYPES,
+    Compression,
+    ImportResult,
+    LineTooLongError,
+    TransferError,
+    export_page,
+    import_stream,
+    iter_export,
+)
+from chat.uploads import QuotaExceededError, StoredFile, get_store
+
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+router = APIRouter(prefix="/api")
+
+
+def require_api_key(request: Request):
+    """Check the bearer token, the API is disabled without `CHAT_API_KEY`."""
+    if not settings.API_KEY:
+        raise HTTPException(status_code=403, detail="The API is disabled")
+    expected = f"Bearer {settings.API_KEY}".encode()
+    given = request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(given, expected):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+
+@router.put("/uploads/{name}", dependencies=[Depends(require_api_key)])
+async def upload_file(name: str, user: str, request: Request) -> StoredFile:
+    """Stream the raw request body into a user's files and index it."""
+    try:
+        stored = await get_store().write(user, name, request.stream())
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    doc = doc_name(stored.user, stored.name)
+    await asyncio.to_thread(get_index().ingest, stored.path, doc)
+    return stored
+
+
+@router.get("/chats/export", dependencies=[Depends(require_api_key)])
+async def export_chats(
+    user: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+    compression: Compression = "gzip",
+) -> StreamingResponse:
+    """Stream a page of chats as JSONL, the next page cursor is in `X-Next-Cursor`."""
+    try:
+        chats, next_cursor = await asyncio.to_thread(export_page, user, cursor, limit)
+        body = iter_export(chats, compression)
+        # Fail early (e.g. zstd unavailable) instead of mid-stream.
+        first = await asyncio.to_thread(next, body, b"")
+    except TransferError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    def content():
+        yield first
+        yield from body
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return StreamingResponse(
+        content(), media_type=MEDIA_TYPES[compression], headers=headers
+    )
+
+
+@router.post("/chats/import", dependencies=[Depends(require_api_key)])
+async def import_chats(
+    request: Request,
+    user: str | None = None,
+    compression: Compression = "gzip",
+) -> ImportResult:
+    """Stream a JSONL archive from the request body into the chat store."""
+    try:
+        return await import_stream(request.stream(), compression, user)
+    except LineTooLongError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    except TransferError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+class MessageRequest(BaseModel):
+    user: str
+    """The user (client token) owning the chat."""
+    message: str
+    agent: str = "simple_agent"
+
+
+def _sse(event: str, data: str) -> bytes:
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+@router.post("/chats/{chat}/messages", dependencies=[Depends(require_api_key)])
+async def send_message(chat: str, body: MessageRequest) -> StreamingResponse:
+    """Ask a question in a chat and stream the answer as server-sent events.
+
+    Events: "delta" (`{"content": ...}`) while streaming, then "done" with the
+    final message, or "error". "restart" voids the deltas so far (the generation
+    is rerun after its worker died). Both messages are stored, so the UI shows them.
+    """
+    messages = await asyncio.to_thread(
+        store.load_chat, body.user, chat, settings.CHAT_PAGE_SIZE
+    )
+    history = [HistoryItem(role=msg.role, content=msg.content) for msg in messages]
+    # Continues the most recently extended branch of the chat.
+    user_message = UIMessage(
+        role="user",
+        content=body.message,
+        html=render_markdown(body.message),
+        parent_id=messages[-1].id if messages else None,
+    )
+    await asyncio.to_thread(store.add_message, body.user, chat, user_message)
+    request = GenerationRequest(
+        agent=body.agent, prompt=body.message, history=history, user=body.user
+    )
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            async for event in generate(request):
+                if event.message:
+                    event.message.parent_id = user_message.id
+                    await asyncio.to_thread(
+                        store.add_message, body.user, chat, event.message
+                    )
+                    yield _sse("done", event.message.model_dump_json())
+                elif event.kind == "restart":
+                    yield _sse("restart", "{}")
+                else:
+                    yield _sse("delta", json.dumps({"content": event.content}))
+        except Exception as e:  # noqa: BLE001
+            yield _sse("error", json.dumps({"detail": str(e)}))
+
+    # No buffering in proxies (nginx), every delta is sent right away.
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
@@ -0,0 +1,207 @@
+"""Run prompts from a JSONL file through the agents, outside of the UI.
+
+Usage: `python -m chat.batch prompts.jsonl results.jsonl [--concurrency 8]`
+
+Each input line is a `GenerationRequest` (`{"prompt": ..., "agent": ...,
+"history": [...]}`, with an optional `id`). Results are appended to the output
+file as they complete, which doubles as checkpoint: re-running the same command
+skips all requests with a successful result.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+import random
+import statistics
+import sys
+import time
+from typing import TYPE_CHECKING, TextIO
+
+from pydantic import BaseModel, ValidationError
+
+from chat import settings
+from chat.agents import pool, warm_pool
+from chat.generation import GenerationRequest, run_generation
+from chat.models import UIMessage  # noqa: TC001
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResult(BaseModel):
+    id: str
+    ok: bool
+    attempts: int
+    latency: float
+    """Seconds of the successful (or last) attempt."""
+    message: UIMessage | None = None
+    error: str | None = None
+
+
+def read_requests(path: Path, done: set[str]) -> Iterator[GenerationRequest]:
+    """Stream the requests of a JSONL file, skipping those in `done`.
+
+    Requests without id get one from their line number, so they resume too.
+    """
+    with path.open(encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if isinstance(data, dict):  # anything else fails the validation
+                    data.setdefault("id", f"line-{number}")
+                request = GenerationRequest.model_validate(data)
+            except (ValueError, ValidationError) as e:
+                logger.warning("Skipping invalid line %s: %s", number, e)
+                continue
+            if request.id not in done:
+                yield request
+
+
+def read_checkpoint(path: Path) -> set[str]:
+    """Get the ids of successful results in an earlier output file."""
+    done: set[str] = set()
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # partially written line of an interrupted run
+            if result.get("ok"):
+                done.add(result["id"])
+    return done
+
+
+async def run_request(
+    request: GenerationRequest, retries: int, timeout: float
+) -> BatchResult:
+    """Run a request, retrying failures with exponential backoff."""
+    attempt = 0
+    while True:
+        attempt += 1
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                message = None
+                async for event in run_generation(request):
+                    message = event.message or message
+            return BatchResult(
+                id=request.id,
+                ok=True,
+                attempts=attempt,
+                latency=time.perf_counter() - start,
+                message=message,
+            )
+        except Exception as e:  # noqa: BLE001
+            if attempt > retries:
+                return BatchResult(
+                    id=request.id,
+                    ok=False,
+                    attempts=attempt,
+                    latency=time.perf_counter() - start,
+                    error=f"{type(e).__name__}: {e}",
+                )
+            delay = min(2**attempt, 30) * random.uniform(0.5, 1)
+            logger.info("Retrying %s in %.1fs: %s", request.id, delay, e)
+            await asyncio.sleep(delay)
+
+
+def report(results: list[BatchResult], elapsed: float) -> str:
+    """Summarize throughput and latency percentiles of a run."""
+    ok = [r.latency for r in results if r.ok]
+    lines = [
+        f"requests: {len(ok)} ok, {len(results) - len(ok)} failed"
+        f" in {elapsed:.1f}s ({len(results) / max(elapsed, 1e-9):.2f}/s)",
+    ]
+    if len(ok) > 1:
+        q = statistics.quantiles(ok, n=100, method="inclusive")
+        lines.append(
+            f"latency: p50 {q[49]:.2f}s, p90 {q[89]:.2f}s, p99 {q[98]:.2f}s,"
+            f" max {max(ok):.2f}s"
+        )
+    return "\n".join(lines)
+
+
+async def run_batch(
+    input_path: Path,
+    output_path: Path,
+    concurrency: int = 8,
+    retries: int = 2,
+    timeout: float = settings.GENERATION_TIMEOUT,
+) -> list[BatchResult]:
+    """Run all pending requests of the input file.
+
+    Args:
+        input_path: JSONL file of generation requests.
+        output_path: JSONL file the results are appended to.
+        concurrency: Maximum number of simultaneous agent runs.
+        retries: Additional attempts for failed requests.
+        timeout: Seconds per attempt.
+    """
+    requests = read_requests(input_path, read_checkpoint(output_path))
+    # Every worker gets an agent copy, instead of waiting for one within its
+    # attempt timeout.
+    warm_pool.max_instances = max(warm_pool.max_instances, concurrency)
+    results: list[BatchResult] = []
+
+    def write(out: TextIO, result: BatchResult):
+        # One write per line, flushed, so an interruption loses at most one result.
+        out.write(result.model_dump_json() + "\n")
+        out.flush()
+
+    async def worker(out: TextIO):
+        # Workers pull from the shared iterator, so the input is read lazily.
+        for request in requests:
+            result = await run_request(request, retries, timeout)
+            results.append(result)
+            write(out, result)
+
+    with output_path.open("a+", encoding="utf-8") as out:
+        out.seek(0, 2)
+        if out.tell():
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")  # terminate a partially written line
+        async with pool, asyncio.TaskGroup() as group:
+            for _ in range(concurrency):
+                group.create_task(worker(out))
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="JSONL file of requests")
+    parser.add_argument("output", type=Path, help="JSONL file of results")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=settings.GENERATION_TIMEOUT)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    start = time.perf_counter()
+    try:
+        results = asyncio.run(
+            run_batch(
+                args.input, args.output, args.concurrency, args.retries, args.timeout
+            )
+        )
+    except KeyboardInterrupt:
+        print("Interrupted, re-run to resume.", file=sys.stderr)
+        return 130
+    print(report(results, time.perf_counter() - start), file=sys.stderr)
+    return 0 if all(r.ok for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Chat branches as a tree of messages with shared prefixes.
+
+Every message points to the previous one of its branch (`UIMessage.parent_id`).
+Editing a question or regenerating an answer adds a sibling instead of copying
+the conversation, so all branches share their common prefix and forking is
+O(1). A branch is the path from its head (latest message) to the root.
+
+Messages also carry the (estimated) token count of their branch up to themselves,
+which is fixed once the message is final and shared by all branches below it.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from chat.models import UIMessage
+
+
+ROOT = ""
+"""Key of the first messages of a chat in `MessageTree.children`."""
+
+
+# Rough characters per token, an estimate that needs no tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+@dataclass
+class MessageTree:
+    """The loaded part of the message tree of a chat."""
+
+    nodes: dict[str, UIMessage] = field(default_factory=dict)
+    children: dict[str, list[str]] = field(default_factory=dict)
+    """Ids of the child messages (also not loaded ones) per parent id, in order."""
+    head: str | None = None
+    """Last message of the current branch."""
+    updated: float | None = None
+    """Change time of the chat in storage when it was loaded."""
+
+    def add(self, message: UIMessage):
+        """Add a message and make it the head of the current branch."""
+        self.nodes[message.id] = message
+        siblings = self.children.setdefault(message.parent_id or ROOT, [])
+        if message.id not in siblings:
+            siblings.append(message.id)
+        if message.branch_tokens is None:
+            self._count(message)
+        self.head = message.id
+
+    def add_branch(self, messages: Iterable[UIMessage]):
+        """Add the messages of a branch (root first) and make it the current one."""
+        for message in messages:
+            self.add(message)
+
+    def remove(self, message_id: str):
+        """Remove a message without children, its parent becomes the head."""
+        if (message := self.nodes.pop(message_id, None)) is None:
+            return
+        siblings = self.children.get(message.parent_id or ROOT, [])
+        if message_id in siblings:
+            siblings.remove(message_id)
+        if self.head == message_id:
+            self.head = message.parent_id
+
+    def replace(self, message: UIMessage):
+        """Replace a message (e.g. the final version of a streamed answer)."""
+        message.branch_tokens = None
+        self.nodes[message.id] = message
+        self._count(message)
+
+    def path(self, head: str | None) -> list[UIMessage]:
+        """Get the loaded messages of a branch, root first.
+
+        Args:
+            head: Last message of the branch (e.g. `self.head`), None for none.
+        """
+        messages = []
+        node_id = head
+        while node_id and (message := self.nodes.get(node_id)):
+            messages.append(message)
+            node_id = message.parent_id
+        return messages[::-1]
+
+    def siblings(self, message: UIMessage) -> list[str]:
+        """Get the ids of all versions of a message (including itself)."""
+        return self.children.get(message.parent_id or ROOT, [message.id])
+
+    def tokens(self, head: str | None) -> int | None:
+        """Get the token count of a branch, None if unknown."""
+        if head is None:
+            return 0
+        message = self.nodes.get(head)
+        return message.branch_tokens if message else None
+
+    def _count(self, message: UIMessage):
+        base = self.tokens(message.parent_id)
+        if base is not None:
+            message.branch_tokens = base + count_tokens(message.content)
@@ -2,26 +2,78 @@
 
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
+import logging
 
+from fastapi.responses import JSONResponse, PlainTextResponse
 import reflex as rx
 
-from chat.agents import pool
+from chat import metrics, speech
+from chat.agents import pool, warm_pool
+from chat.api import router
+from chat.generation import run_worker
 from chat.pages import chat_page, welcome
+from chat.sessions import SessionMiddleware, run_evictor
 
 
+logger = logging.getLogger(__name__)
+
 # Add state and page to the app.
 theme = rx.theme(appearance="dark", accent_color="cyan", scaling="110%", radius="small")
 app = rx.App(theme=theme)
+app.add_middleware(SessionMiddleware())
 
 
 @asynccontextmanager
 async def run_pool():
     async with pool:
-        yield
+        # Warm up in the background so the server can report "not ready" meanwhile.
+        warm_up = asyncio.create_task(warm_pool.warm_up())
+        warm_up.add_done_callback(_warmed_up)
+        try:
+            yield
+        finally:
+            warm_up.cancel()
+            await warm_pool.close()
+            speech.shutdown()
+
+
+def _warmed_up(task: asyncio.Task[None]):
+    if task.cancelled() or (error := task.exception()) is None:
+        return
+    # Agents are still created on demand, just without the head start.
+    logger.error("Agent warm-up failed, serving without it", exc_info=error)
+    warm_pool.degraded = True
+    warm_pool.ready = True
+
+
+async def ping() -> JSONResponse:
+    """Readiness endpoint, only answers once the warm-up completed (or failed)."""
+    if not warm_pool.ready:
+        return JSONResponse("warming up", status_code=503)
+    return JSONResponse("degraded" if warm_pool.degraded else "pong")
+
+
+async def metrics_endpoint() -> PlainTextResponse:
+    """Prometheus metrics of this worker process."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 app.register_lifespan_task(run_pool)
+app.register_lifespan_task(run_worker)
+app.register_lifespan_task(run_evictor, reflex_app=app)
+
+if app.api:
+    # Replace Reflex' default /ping so load balancers wait for the warm-up.
+    app.api.router.routes = [
+        route
+        for route in app.api.router.routes
+        if getattr(route, "path", None) != "/ping"
+    ]
+    app.api.add_api_route("/ping", ping, methods=["GET"])
+    app.api.add_api_route("/metrics", metrics_endpoint, methods=["GET"])
+    app.api.include_router(router)
 
 # Register the pages
 app.add_page(welcome)
@@ -8,12 +8,15 @@ import reflex as rx
 import reflex_chakra as rc
 from reflexions import loading_icon
 
-from chat.state import State, UIMessage
+from chat.components.voice import voice_button
+from chat.state import State
 
 
 if TYPE_CHECKING:
     from llmling_agent import ToolCallInfo
 
+    from chat.models import UIMessage
+
 
 message_style: dict[str, Any] = dict(
     display="inline-block",
@@ -22,6 +25,18 @@ message_style: dict[str, Any] = dict(
     max_width=["30em", "30em", "50em", "50em", "50em", "50em"],
 )
 
+# Styles for server-rendered HTML, code colors are inlined by pygments.
+RENDERED_STYLE: dict[str, Any] = {
+    "& pre": {
+        "background_color": "#272822",
+        "padding": "0.75em",
+        "border_radius": "6px",
+        "overflow_x": "auto",
+        "text_align": "left",
+    },
+    "& p:not(:last-child)": {"margin_bottom": "0.5em"},
+}
+
 INPUT_MSG = "Enter a question to get a response."
 
 
@@ -32,11 +47,25 @@ def input_form() -> rx.Component:
             rx.input(
                 rx.input.slot(rx.tooltip(rx.icon("info", size=18), content=INPUT_MSG)),
                 placeholder="Stelle eine Frage...",
+                # Uncontrolled: typing stays in the browser, the value is only sent
+                # with the form on submit.
                 id="question",
-                value=State.input_question,
-                on_change=State.set_input_question,
                 width=["15em", "20em", "45em", "50em", "50em", "50em"],
             ),
+            voice_button(),
+            rx.cond(
+                State.editing,
+                rx.tooltip(
+                    rx.icon_button(
+                        rx.icon("x", size=16),
+                        on_click=State.cancel_edit,
+                        type="button",
+                        variant="soft",
+                        color_scheme="gray",
+                    ),
+                    content="Bearbeiten abbrechen",
+                ),
+            ),
             rx.button(
                 rx.cond(
                     State.processing,
@@ -93,18 +122,89 @@ def message_exchange(msg: UIMessage) -> rx.Component:
         A component displaying the message
     """
     # We use conditional rendering based on a pre-set field, not computed
+    background_color = rx.color(rx.cond(msg.role == "user", "mauve", "accent"), 4)
+    color = rx.color(rx.cond(msg.role == "user", "mauve", "accent"), 12)
     return rx.box(
         rx.badge(msg.role, variant="soft"),
         rx.spacer(),
-        rx.markdown(
-            msg.content,
-            background_color=rx.color(rx.cond(msg.role == "user", "mauve", "accent"), 4),
-            color=rx.color(rx.cond(msg.role == "user", "mauve", "accent"), 12),
-            **message_style,
+        rx.cond(
+            msg.html,
+            # Finalized messages come pre-rendered from the server.
+            rx.html(
+                msg.html.to(str),
+                background_color=background_color,
+                color=color,
+                style=RENDERED_STYLE,
+                **message_style,
+            ),
+            # Only the message which is currently streaming is parsed client-side.
+            rx.markdown(
+                msg.content,
+                background_color=background_color,
+                color=color,
+                **message_style,
+            ),
         ),
+        message_actions(msg),
         text_align=rx.cond(msg.role == "user", "right", "left"),
         margin_top="1em",
         width="100%",
+        id=msg.id,  # scroll target for search results
+    )
+
+
+def message_actions(msg: UIMessage) -> rx.Component:
+    """Edit / regenerate a message and switch between its versions.
+
+    Args:
+        msg: The message.
+    """
+    return rx.hstack(
+        rx.cond(
+            State.versions.contains(msg.id),
+            rx.hstack(
+                rx.icon_button(
+                    rx.icon("chevron-left", size=14),
+                    on_click=State.switch_version(msg.id, -1),  # pyright: ignore
+                    variant="ghost",
+                    size="1",
+                ),
+                rx.text(State.versions[msg.id], size="1", color_scheme="gray"),
+                rx.icon_button(
+                    rx.icon("chevron-right", size=14),
+                    on_click=State.switch_version(msg.id, 1),  # pyright: ignore
+                    variant="ghost",
+                    size="1",
+                ),
+                align="center",
+                spacing="1",
+            ),
+        ),
+        rx.cond(
+            msg.role == "user",
+            rx.tooltip(
+                rx.icon_button(
+                    rx.icon("pencil", size=14),
+                    on_click=State.edit_message(msg.id),  # pyright: ignore
+                    variant="ghost",
+                    size="1",
+                ),
+                content="Frage bearbeiten",
+            ),
+            rx.tooltip(
+                rx.icon_button(
+                    rx.icon("refresh-cw", size=14),
+                    on_click=State.regenerate(msg.id),  # pyright: ignore
+                    variant="ghost",
+                    size="1",
+                ),
+                content="Neu generieren",
+            ),
+        ),
+        justify=rx.cond(msg.role == "user", "end", "start"),
+        visibility=rx.cond(State.processing, "hidden", "visible"),
+        margin_top="0.25em",
+        width="100%",
     )
 
 
@@ -116,7 +216,7 @@ def chat() -> rx.Component:
             width="100%",
         ),
         rx.box(
-            rx.foreach(State.chats[State.current_chat], message_exchange),
+            rx.foreach(State.messages, message_exchange),
             width="100%",
             padding_bottom="80px",  # to prevent being hidden behind actionbar
         ),
@@ -1,28 +1,18 @@
 from __future__ import annotations
 
 import reflex as rx
+from reflex.experimental.client_state import ClientStateVar
 
 
-class Content(rx.State):
-    links: list[dict[str, str]] = [  # noqa: RUF012
-        {"label": "Home", "link": "/", "color": "gray"},
-        {"label": "Chat", "link": "/chat", "color": "gray"},
-        {"label": "FAQ", "link": "#faq", "color": "gray"},
-    ]
+LINKS = [
+    {"label": "Home", "link": "/"},
+    {"label": "Chat", "link": "/chat"},
+    {"label": "FAQ", "link": "#faq"},
+]
 
-    index: int = 0
-    position_y: str = "10px"
-
-    async def toggle_table_content(self, index: int, item: dict[str, str]) -> None:
-        self.links = [
-            (
-                {**data, "color": rx.color("slate", 11)}
-                if data["label"] != item["label"]
-                else {**data, "color": rx.color("slate", 12)}
-            )
-            for data in self.links
-        ]
-        self.position_y = f"{10 + (index * 30)}px"
+# Index of the highlighted item. Only affects the view, so it lives in the
+# browser and clicks do not send events to the backend.
+active_item = ClientStateVar.create("menu_active_item", default=-1)
 
 
 def items(index: int, data: dict[str, str]):
@@ -31,9 +21,14 @@ def items(index: int, data: dict[str, str]):
             rx.text(
                 data["label"],
                 font_size="12px",
-                color=data["color"],
+                color=rx.match(
+                    active_item.value,
+                    (-1, "gray"),
+                    (index, rx.color("slate", 12)),
+                    rx.color("slate", 11),
+                ),
                 weight="medium",
-                on_click=Content.toggle_table_content(index, data),  # type: ignore
+                on_click=active_item.set_value(index),
             ),
             href=data["link"],
             text_decoration="none",
@@ -75,13 +70,12 @@ def menus_v1():
                 bg=rx.color("blue"),
                 position="absolute",
                 left="-4.5px",
-                top=Content.position_y,
+                top=rx.cond(
+                    active_item.value > 0, f"{active_item.value * 30 + 10}px", "10px"
+                ),
                 transition="all 200ms ease-out",
             ),
-            rx.foreach(
-                Content.links,
-                lambda data, index: items(index, data),
-            ),
+            *[items(index, data) for index, data in enumerate(LINKS)],
             spacing="0",
             position="relative",
         ),
@@ -5,6 +5,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 
 import reflex as rx
+from reflex.experimental.client_state import ClientStateVar
 import reflex_chakra as rc
 
 
@@ -24,7 +25,6 @@ class ModelSelectorState(rx.State):
     selected_provider: str = ""
     selected_model_name: str = ""
     selected_model: Any = None
-    is_expanded: bool = True
     current_model_id: str = ""
 
     def initialize(self, agent, providers: Sequence[ProviderType] | None = None) -> None:
@@ -88,10 +88,6 @@ class ModelSelectorState(rx.State):
         self.selected_model_name = model_name
         self._update_selected_model()
 
-    def toggle_expanded(self) -> None:
-        """Toggle expanded state."""
-        self.is_expanded = not self.is_expanded
-
     def _update_provider_models(self) -> None:
         """Update models based on selected provider."""
         self.provider_models = [
@@ -130,6 +126,8 @@ def model_selector(
     """
     # Initialize state on first render
     rx.call_script(ModelSelectorState.initialize, agent, providers)
+    # Whether the details are shown is view-only state, kept in the browser.
+    is_expanded = ClientStateVar.create(default=expanded)
 
     # Build the component
     return rx.vstack(
@@ -171,18 +169,18 @@ def model_selector(
                     rx.spacer(),
                     rx.button(
                         rx.cond(
-                            ModelSelectorState.is_expanded,
+                            is_expanded.value,
                             rx.icon(tag="chevron-up"),
                             rx.icon(tag="chevron-down"),
                         ),
                         variant="ghost",
                         size="sm",
-                        on_click=ModelSelectorState.toggle_expanded,  # pyright: ignore
+                        on_click=is_expanded.set_value(~is_expanded.value),
                     ),
                     width="100%",
                 ),
                 rx.cond(
-                    ModelSelectorState.is_expanded,
+                    is_expanded.value,
                     rx.box(
                         rx.markdown(ModelSelectorState.selected_model.format()),
                         background_color=rx.color("mauve", 2),
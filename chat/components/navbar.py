@@ -4,6 +4,8 @@ from typing import TYPE_CHECKING
 
 import reflex as rx
 
+from chat.components.search import search_dialog
+from chat.components.sidebar import sidebar
 from chat.state import State
 
 
@@ -24,58 +26,6 @@ def get_button(tag: str, color: ColorType = "mauve") -> Button:
     return rx.button(icon, background_color=rx.color("mauve", 6))
 
 
-def sidebar_chat(chat: str) -> rx.Component:
-    """A sidebar chat item.
-
-    Args:
-        chat: The chat item.
-    """
-    return rx.drawer.close(
-        rx.hstack(
-            rx.button(
-                chat,
-                on_click=lambda: State.set_chat(chat),  # type: ignore
-                width="80%",
-                variant="surface",
-            ),  # pyright: ignore
-            rx.button(
-                rx.icon(tag="trash", on_click=State.delete_chat, stroke_width=1),  # type: ignore
-                width="20%",
-                variant="surface",
-                color_scheme="red",
-            ),
-            width="100%",
-        )
-    )
-
-
-def sidebar(trigger) -> rx.Component:
-    """The sidebar component."""
-    return rx.drawer.root(
-        rx.drawer.trigger(trigger),
-        rx.drawer.overlay(),
-        rx.drawer.portal(
-            rx.drawer.content(
-                rx.vstack(
-                    rx.heading("Chats", color=rx.color("mauve", 11)),
-                    rx.divider(),
-                    rx.foreach(State.chat_titles, lambda chat: sidebar_chat(chat)),
-                    align_items="stretch",
-                    width="100%",
-                ),
-                top="auto",
-                right="auto",
-                height="100%",
-                width="20em",
-                padding="2em",
-                background_color=rx.color("mauve", 2),
-                outline="none",
-            )
-        ),
-        direction="left",
-    )
-
-
 def modal(trigger) -> rx.Component:
     """A modal to create a new chat."""
     return rx.dialog.root(
@@ -110,6 +60,7 @@ def navbar():
             rx.hstack(
                 modal(rx.button("+ New chat")),
                 sidebar(get_button("messages-square")),
+                search_dialog(get_button("search")),
                 rx.desktop_only(get_button("sliders-horizontal")),
                 align_items="center",
             ),
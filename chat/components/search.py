@@ -0,0 +1,130 @@
+"""Full-text search across all chats of the user."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import reflex as rx
+
+from chat import settings
+from chat.state import State
+from chat.storage import SearchHit, store
+
+
+class SearchState(rx.State):
+    """State for the chat search dialog."""
+
+    query: str = ""
+    hits: list[SearchHit] = []  # noqa: RUF012
+    page: int = 0
+    has_more: bool = False
+
+    async def search(self, form_data: dict[str, Any]):
+        """Run a new search.
+
+        Args:
+            form_data: Form data containing the query.
+        """
+        self.query = form_data["query"]
+        self.page = 0
+        await self._load()
+
+    async def next_page(self):
+        """Show the next page of results."""
+        self.page += 1
+        await self._load()
+
+    async def previous_page(self):
+        """Show the previous page of results."""
+        self.page = max(self.page - 1, 0)
+        await self._load()
+
+    async def open_hit(self, chat: str, message_id: str):
+        """Switch to the branch of a hit and scroll to the message.
+
+        Args:
+            chat: The chat name.
+            message_id: The message to scroll to.
+        """
+        chat_state = await self.get_state(State)
+        await chat_state.open_message(chat, message_id)
+        return [rx.redirect("/chat"), rx.scroll_to(message_id)]
+
+    async def _load(self):
+        size = settings.SEARCH_PAGE_SIZE
+        user = self.router.session.client_token
+        # Fetch one extra hit to know whether there is a next page.
+        hits = await asyncio.to_thread(
+            store.search, user, self.query, size + 1, self.page * size
+        )
+        self.has_more = len(hits) > size
+        self.hits = hits[:size]
+
+
+def search_hit(hit: SearchHit) -> rx.Component:
+    """A single search result."""
+    return rx.dialog.close(
+        rx.box(
+            rx.hstack(
+                rx.badge(hit.chat),
+                rx.badge(hit.role, variant="soft"),
+                spacing="1",
+            ),
+            rx.html(hit.snippet, font_size="0.9em", margin_top="0.25em"),
+            on_click=SearchState.open_hit(hit.chat, hit.message_id),  # pyright: ignore
+            cursor="pointer",
+            padding="0.5em",
+            border_radius="md",
+            _hover={"background_color": rx.color("mauve", 4)},
+            width="100%",
+        )
+    )
+
+
+def search_dialog(trigger) -> rx.Component:
+    """A dialog to search all chats."""
+    return rx.dialog.root(
+        rx.dialog.trigger(trigger),
+        rx.dialog.content(
+            rx.form(
+                rx.hstack(
+                    rx.input(
+                        name="query",
+                        placeholder="Chats durchsuchen...",
+                        default_value=SearchState.query,
+                        width="100%",
+                    ),
+                    rx.button(rx.icon("search"), type="submit"),
+                    width="100%",
+                ),
+                on_submit=SearchState.search,
+            ),
+            rx.scroll_area(
+                rx.vstack(
+                    rx.foreach(SearchState.hits, search_hit),
+                    width="100%",
+                ),
+                max_height="60vh",
+                margin_y="1em",
+            ),
+            rx.hstack(
+                rx.button(
+                    rx.icon("chevron-left"),
+                    on_click=SearchState.previous_page,
+                    disabled=SearchState.page == 0,
+                    variant="soft",
+                ),
+                rx.text(f"Seite {SearchState.page + 1}"),
+                rx.button(
+                    rx.icon("chevron-right"),
+                    on_click=SearchState.next_page,
+                    disabled=~SearchState.has_more,
+                    variant="soft",
+                ),
+                justify="end",
+                align="center",
+            ),
+            background_color=rx.color("mauve", 1),
+        ),
+    )
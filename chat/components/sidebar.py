@@ -0,0 +1,138 @@
+"""Sidebar listing the chats of the user, most recently used first."""
+
+from __future__ import annotations
+
+import asyncio
+
+import reflex as rx
+
+from chat import settings
+from chat.state import State
+from chat.storage import ChatEntry, store
+
+
+class SidebarState(rx.State):
+    """A page-wise view on the recency index of the user's chats."""
+
+    entries: list[ChatEntry] = []  # noqa: RUF012
+    query: str = ""
+    has_more: bool = False
+
+    async def open(self):
+        """Load the first page when the sidebar opens."""
+        await self._load()
+
+    async def filter(self, query: str):
+        """Only show chats whose name contains the query.
+
+        Args:
+            query: The filter text.
+        """
+        self.query = query
+        await self._load()
+
+    async def load_more(self):
+        """Append the next page."""
+        await self._load(self.entries[-1] if self.entries else None)
+
+    async def delete(self, chat: str):
+        """Delete a chat and remove it from the list.
+
+        Args:
+            chat: The chat name.
+        """
+        chat_state = await self.get_state(State)
+        await chat_state.delete_chat(chat)
+        self.entries = [entry for entry in self.entries if entry.name != chat]
+
+    async def _load(self, before: ChatEntry | None = None):
+        size = settings.SIDEBAR_PAGE_SIZE
+        user = self.router.session.client_token
+        # Fetch one extra entry to know whether there is a next page.
+        entries = await asyncio.to_thread(
+            store.recent_chats, user, self.query, before, size + 1
+        )
+        self.has_more = len(entries) > size
+        page = entries[:size]
+        self.entries = [*self.entries, *page] if before else page
+
+
+def sidebar_chat(entry: ChatEntry) -> rx.Component:
+    """A sidebar chat item.
+
+    Args:
+        entry: The chat item.
+    """
+    return rx.hstack(
+        rx.drawer.close(
+            rx.button(
+                entry.name,
+                on_click=State.set_chat(entry.name),  # pyright: ignore
+                # Load the messages while the pointer moves to the click.
+                on_mouse_enter=State.prefetch_chat(entry.name),  # pyright: ignore
+                width="80%",
+                variant=rx.cond(entry.name == State.current_chat, "solid", "surface"),
+            ),
+        ),
+        rx.button(
+            rx.icon(tag="trash", stroke_width=1),
+            on_click=SidebarState.delete(entry.name),  # pyright: ignore
+            width="20%",
+            variant="surface",
+            color_scheme="red",
+        ),
+        width="100%",
+    )
+
+
+def sidebar(trigger) -> rx.Component:
+    """The sidebar component."""
+    return rx.drawer.root(
+        # Only opening needs the backend. Radix keeps the open state in the
+        # browser, so closing the drawer sends no event.
+        rx.drawer.trigger(trigger, on_click=SidebarState.open),
+        rx.drawer.overlay(),
+        rx.drawer.portal(
+            rx.drawer.content(
+                rx.vstack(
+                    rx.heading("Chats", color=rx.color("mauve", 11)),
+                    rx.input(
+                        placeholder="Chats filtern...",
+                        value=SidebarState.query,
+                        on_change=SidebarState.filter,
+                        debounce_timeout=300,
+                        width="100%",
+                    ),
+                    rx.divider(),
+                    rx.scroll_area(
+                        rx.vstack(
+                            rx.foreach(SidebarState.entries, sidebar_chat),
+                            rx.cond(
+                                SidebarState.has_more,
+                                rx.button(
+                                    "Mehr laden",
+                                    on_click=SidebarState.load_more,
+                                    variant="soft",
+                                    width="100%",
+                                ),
+                            ),
+                            align_items="stretch",
+                            width="100%",
+                        ),
+                        flex="1",
+                    ),
+                    align_items="stretch",
+                    width="100%",
+                    height="100%",
+                ),
+                top="auto",
+                right="auto",
+                height="100%",
+                width="20em",
+                padding="2em",
+                background_color=rx.color("mauve", 2),
+                outline="none",
+            )
+        ),
+        direction="left",
+    )
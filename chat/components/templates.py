@@ -1,15 +1,8 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
-
+import reflex as rx
 import reflexions as rfx
 
-from chat.state import State
-
-
-if TYPE_CHECKING:
-    import reflex as rx
-
 
 item_1 = rfx.CardItem(
     icon="message-circle",
@@ -40,5 +33,10 @@ item_4 = rfx.CardItem(
 )
 
 
+def fill_question(item: rfx.CardItem) -> rx.event.EventSpec:
+    """Put the card's example question into the input field, client-side only."""
+    return rx.set_value("question", item.description)
+
+
 def templates() -> rx.Component:
-    return rfx.cards([item_1, item_2, item_3, item_4], on_click=State.set_input_question)
+    return rfx.cards([item_1, item_2, item_3, item_4], on_click=fill_question)
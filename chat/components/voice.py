@@ -0,0 +1,163 @@
+"""Voice input: recorded chunks are transcribed live into the question input."""
+
+from __future__ import annotations
+
+import base64
+import wave
+
+import reflex as rx
+from reflex_audio_capture import AudioRecorderPolyfill, get_codec, strip_codec_part
+
+from chat import settings, speech
+from chat.state import State
+
+
+# Audio of the current phrase per session (client token), kept in the process
+# instead of the state: that is serialized on every event (e.g. into Redis), and
+# the websocket of a session stays with one backend worker.
+_audio: dict[str, tuple[speech.AudioFormat, bytearray]] = {}
+
+
+class VoiceState(rx.State):
+    """State of the voice input."""
+
+    transcript: str = ""
+    # Whether the speech engine loaded, voice input is hidden otherwise.
+    available: bool = False
+    # Text of the finished phrases.
+    _phrases: str = ""
+    # Whether audio arrived since the last transcription started, whether one is
+    # running, and whether the recording stopped meanwhile.
+    _pending: bool = False
+    _busy: bool = False
+    _stopped: bool = False
+    # Counts the recordings, a transcription of an earlier one is discarded.
+    _recording: int = 0
+
+    @rx.event(background=True)
+    async def check_available(self):
+        """Offer voice input only if the speech engine loads."""
+        available = await speech.available()
+        async with self:
+            self.available = available
+
+    def start(self):
+        """Reset the transcript for a new recording."""
+        self.transcript = self._phrases = ""
+        _audio.pop(self.router.session.client_token, None)
+        self._pending = self._stopped = False
+        self._recording += 1
+
+    def add_chunk(self, chunk: str):
+        """Add a recorded chunk to the current phrase and transcribe it.
+
+        Only collects the audio, so chunks and the stop of the recording are
+        handled in order; the transcription runs in the background.
+
+        Args:
+            chunk: The audio chunk as data URI.
+        """
+        audio = base64.b64decode(strip_codec_part(chunk).partition(",")[2])
+        if not audio:
+            return None
+        try:
+            audio_format, frames = speech.read_wav(audio)
+        except (wave.Error, EOFError):
+            return rx.toast.error(f"Unsupported audio format: {get_codec(chunk)}")
+        token = self.router.session.client_token
+        phrase = _audio.get(token)
+        if phrase is None or phrase[0] != audio_format:
+            phrase = _audio[token] = (audio_format, bytearray())
+        phrase[1].extend(frames)
+        self._pending = True
+        if self._busy:
+            return None
+        self._busy = True
+        return VoiceState.transcribe_phrase
+
+    @rx.event(background=True)
+    async def transcribe_phrase(self):
+        """Transcribe the current phrase until no new audio is left."""
+        try:
+            while True:
+                async with self:
+                    if not self._pending:
+                        self._busy = False
+                        events = self._submit() if self._stopped else None
+                        break
+                    self._pending = False
+                    recording = self._recording
+                    audio_format, buffer = _audio[self.router.session.client_token]
+                    frames = bytes(buffer)
+                text = await speech.transcribe(speech.write_wav(audio_format, frames))
+                async with self:
+                    if recording != self._recording:
+                        continue
+                    current = f"{self._phrases} {text}".strip()
+                    # The next phrase starts after a pause, so no word is cut.
+                    if speech.ends_in_pause(audio_format, frames) or (
+                        speech.duration(audio_format, frames)
+                        >= settings.STT_MAX_PHRASE_SECONDS
+                    ):
+                        self._phrases = current
+                        del buffer[: len(frames)]
+                    self.transcript = current
+                yield rx.set_value("question", current)
+        except speech.SpeechUnavailableError:
+            async with self:
+                self._busy = False
+                self.available = False
+            yield rx.toast.error("Spracherkennung nicht verfügbar")
+            return
+        yield events
+
+    def submit(self):
+        """Ask the transcribed question once the recording stopped."""
+        if self._busy:
+            # The transcription of the last chunks submits when it is done.
+            self._stopped = True
+            return None
+        return self._submit()
+
+    def _submit(self):
+        question, self.transcript = self.transcript, ""
+        _audio.pop(self.router.session.client_token, None)
+        self._stopped = False
+        if not question:
+            return None
+        return [
+            rx.set_value("question", ""),
+            State.process_question({"question": question}),  # pyright: ignore
+        ]
+
+    def on_error(self, error: dict):
+        """Report recording errors."""
+        return rx.toast.error(f"Aufnahme fehlgeschlagen: {error}")
+
+
+capture = AudioRecorderPolyfill.create(
+    id="voice_capture",
+    on_start=VoiceState.start,
+    on_data_available=VoiceState.add_chunk,
+    on_stop=VoiceState.submit,
+    on_error=VoiceState.on_error,
+    timeslice=settings.VOICE_CHUNK_MS,
+    # WAV chunks are self-contained and need no decoder in the speech engine.
+    use_mp3=False,
+)
+
+
+def voice_button() -> rx.Component:
+    """A button to start / stop recording a question."""
+    return rx.fragment(
+        capture,
+        rx.cond(
+            VoiceState.available,
+            rx.cond(
+                capture.is_recording,
+                rx.button(rx.icon("square"), on_click=capture.stop, color_scheme="red"),
+                rx.button(rx.icon("mic"), on_click=capture.start, variant="soft"),
+            ),
+        ),
+        on_mount=VoiceState.check_available,
+    )
@@ -0,0 +1,308 @@
+"""Local document ingestion and retrieval for the agents.
+
+Uploaded files are streamed through parsing and chunking, embedded in batches
+on CPU and stored in a memory-mapped vector index, which supports incremental
+adds and deletes (via tombstones). `search_documents` exposes the index to the
+agents as a tool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+from contextlib import contextmanager
+import fcntl
+import functools
+import itertools
+from pathlib import Path
+import re
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Protocol
+import zlib
+
+import numpy as np
+
+from chat import settings
+from chat.uploads import current_user
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+
+READ_BLOCK = 64 * 1024
+_WORD = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed texts into an (n, dim) float32 array of unit vectors."""
+        ...
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder over words and word bigrams.
+
+    Runs on CPU without model downloads and is deterministic across processes.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            bigrams = (f"{a} {b}" for a, b in itertools.pairwise(words))
+            for token in itertools.chain(words, bigrams):
+                h = zlib.crc32(token.encode())
+                vectors[i, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def iter_text(path: Path) -> Iterator[str]:
+    """Stream a text file in blocks. Binary files yield nothing."""
+    with path.open("rb") as f:
+        first = f.read(READ_BLOCK)
+        if b"\x00" in first:
+            return
+        # Incremental decoder, so multi-byte characters may span blocks.
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        block = first
+        while block:
+            yield decoder.decode(block)
+            block = f.read(READ_BLOCK)
+        yield decoder.decode(b"", final=True)
+
+
+def iter_chunks(
+    blocks: Iterable[str], size: int = 1200, overlap: int = 200
+) -> Iterator[str]:
+    """Cut a stream of text into overlapping chunks of roughly `size` characters.
+
+    Chunks end at a paragraph / line / word boundary where possible. Boundaries
+    are only looked for in the upper half of the room left by the overlap, so each
+    chunk advances by at least half of `size - overlap` characters.
+
+    Raises:
+        ValueError: If `overlap` is not smaller than `size`.
+    """
+    if not 0 <= overlap < size:
+        msg = f"Overlap {overlap} must be >= 0 and smaller than the chunk size {size}"
+        raise ValueError(msg)
+    earliest = overlap + max((size - overlap) // 2, 1)
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        while len(buffer) >= size:
+            cut = max(buffer.rfind(sep, earliest, size) for sep in ("\n\n", "\n", " "))
+            cut = cut if cut > 0 else size
+            if chunk := buffer[:cut].strip():
+                yield chunk
+            buffer = buffer[cut - overlap :]
+    if chunk := buffer.strip():
+        yield chunk
+
+
+class DocumentIndex:
+    """Memory-mapped vector index of document chunks.
+
+    Files in `directory`:
+        vectors.f32: float32 rows of the chunk embeddings, append-only
+        alive.u8: one byte per row, 0 marks a deleted chunk
+        chunks.db: SQLite table mapping rows to document and chunk text
+    """
+
+    def __init__(self, directory: str | Path, embedder: Embedder):
+        self.directory = Path(directory)
+        self.embedder = embedder
+        self._local = threading.local()
+        self._vectors: np.memmap | None = None
+        self._alive: np.memmap | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if (conn := getattr(self._local, "conn", None)) is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.directory / "chunks.db", isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks"
+                " (row INTEGER PRIMARY KEY, doc TEXT NOT NULL, text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc)")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def _alive_path(self) -> Path:
+        return self.directory / "alive.u8"
+
+    def __len__(self) -> int:
+        if not self._vectors_path.exists():
+            return 0
+        return self._vectors_path.stat().st_size // (self.embedder.dim * 4)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        # Workers may share the index directory, writes are serialized by a file lock.
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with (self.directory / ".lock").open("w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _maps(self) -> tuple[np.memmap, np.memmap] | None:
+        """Get (re-)mapped vectors and tombstones, remapping when the index grew."""
+        # A concurrent writer may have appended vectors but not yet tombstone bytes.
+        alive_rows = self._alive_path.stat().st_size if self._alive_path.exists() else 0
+        rows = min(len(self), alive_rows)
+        if rows == 0:
+            return None
+        if self._vectors is None or self._alive is None or len(self._vectors) != rows:
+            shape = (rows, self.embedder.dim)
+            self._vectors = np.memmap(self._vectors_path, np.float32, "r", shape=shape)
+            self._alive = np.memmap(self._alive_path, np.uint8, "r", shape=(rows,))
+        return self._vectors, self._alive
+
+    def ingest(self, path: str | Path, doc: str | None = None) -> int:
+        """Index a file, replacing an earlier version of the same document.
+
+        Args:
+            path: The file to index.
+            doc: Document name, defaults to the file name.
+
+        Returns:
+            The number of indexed chunks.
+        """
+        path = Path(path)
+        doc = doc or path.name
+        self.delete(doc)
+        chunks = iter_chunks(
+            iter_text(path), settings.DOCUMENTS_CHUNK_SIZE, settings.DOCUMENTS_OVERLAP
+        )
+        count = 0
+        for batch in itertools.batched(chunks, settings.DOCUMENTS_BATCH_SIZE):
+            self._add(doc, list(batch))
+            count += len(batch)
+        return count
+
+    def _add(self, doc: str, texts: list[str]):
+        vectors = self.embedder.embed(texts)
+        with self._write_lock():
+            start = len(self)
+            with self._vectors_path.open("ab") as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            with self._alive_path.open("ab") as f:
+                f.write(b"\x01" * len(texts))
+            self.db.executemany(
+                "INSERT OR REPLACE INTO chunks (row, doc, text) VALUES (?, ?, ?)",
+                [(start + i, doc, text) for i, text in enumerate(texts)],
+            )
+
+    def delete(self, doc: str) -> int:
+        """Remove all chunks of a document.
+
+        Returns:
+            The number of removed chunks.
+        """
+        with self._write_lock():
+            rows = [
+                r
+                for (r,) in self.db.execute(
+                    "SELECT row FROM chunks WHERE doc = ?", (doc,)
+                )
+            ]
+            if not rows:
+                return 0
+            alive = np.memmap(self._alive_path, np.uint8, "r+", shape=(len(self),))
+            alive[rows] = 0
+            alive.flush()
+            self.db.execute("DELETE FROM chunks WHERE doc = ?", (doc,))
+        return len(rows)
+
+    def search(
+        self, query: str, k: int = 5, prefix: str | None = None
+    ) -> list[tuple[str, str, float]]:
+        """Get the k chunks most similar to the query.
+
+        Args:
+            query: The text to compare with.
+            k: Number of chunks.
+            prefix: Only search documents whose name starts with it.
+
+        Returns:
+            Tuples of (document, chunk text, score), best first.
+        """
+        if (maps := self._maps()) is None:
+            return []
+        vectors, alive = maps
+        candidates = np.arange(len(vectors))
+        if prefix:
+            # Name range of the prefix, so the doc index is used.
+            end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            selected = self.db.execute(
+                "SELECT row FROM chunks WHERE doc >= ? AND doc < ?", (prefix, end)
+            )
+            candidates = np.fromiter((r for (r,) in selected), np.int64)
+            candidates = candidates[candidates < len(vectors)]
+            vectors, alive = vectors[candidates], alive[candidates]
+        scores = vectors @ self.embedder.embed([query])[0]
+        scores[alive == 0] = -np.inf
+        if (k := min(k, len(scores))) < 1:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        top = {
+            int(candidates[i]): float(scores[i]) for i in best if np.isfinite(scores[i])
+        }
+        if not top:
+            return []
+        marks = ",".join("?" * len(top))
+        query_rows = f"SELECT row, doc, text FROM chunks WHERE row IN ({marks})"
+        rows = {
+            row: (doc, text) for row, doc, text in self.db.execute(query_rows, list(top))
+        }
+        return [(*rows[i], score) for i, score in top.items() if i in rows]
+
+
+def doc_name(user: str, name: str) -> str:
+    """Get the index name of a user's file."""
+    return f"{user}/{name}"
+
+
+@functools.cache
+def get_index() -> DocumentIndex:
+    embedder = HashingEmbedder(settings.DOCUMENTS_EMBED_DIM)
+    return DocumentIndex(settings.DOCUMENTS_DIR, embedder)
+
+
+async def search_documents(query: str, k: int = 5) -> str:
+    """Search the uploaded documents for passages relevant to a question.
+
+    Args:
+        query: What to look for, e.g. the user's question.
+        k: Number of passages to return.
+
+    Returns:
+        The best matching passages with their file names.
+    """
+    if (user := current_user.get()) is None:
+        return "No documents available."
+    # Chosen by the model, so kept within bounds.
+    k = min(max(k, 1), settings.DOCUMENTS_MAX_RESULTS)
+    prefix = doc_name(user, "")
+    hits = await asyncio.to_thread(get_index().search, query, k, prefix)
+    if not hits:
+        return "No matching documents found."
+    return "\n\n".join(f"[{doc[len(prefix) :]}]\n{text}" for doc, text, _ in hits)
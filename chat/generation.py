@@ -0,0 +1,298 @@
+"""Generation queue for running agent streams on any backend worker.
+
+With Redis configured, a generation request is pushed onto a shared queue and
+picked up by whichever worker has capacity. The stream events are published on a
+per-request channel, which the worker holding the client's websocket subscribes to.
+Without Redis, the agent runs inline in the current process.
+
+A worker moves each request into its own processing list and only removes it
+once served. Workers keep a heartbeat key alive; the processing list of a worker
+whose heartbeat expired (it crashed or was killed) goes back onto the queue, and
+the rerun starts with a "restart" event. Requests cancelled on shutdown go back
+onto the queue right away. Redis errors are logged and retried with a backoff.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from typing import TYPE_CHECKING, Literal
+import uuid
+
+from pydantic import BaseModel, Field
+
+from chat import metrics, routing, settings
+from chat.agents import warm_pool
+from chat.models import CachedTokenCost, UIMessage
+from chat.rendering import render_markdown
+from chat.uploads import current_user
+
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from redis.asyncio import Redis
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "chat:generation:queue"
+WORKERS_KEY = "chat:generation:workers"
+
+# Maximum seconds to wait before retrying after a Redis error.
+MAX_BACKOFF = 30
+
+
+class GenerationError(Exception):
+    """Raised when a generation failed on the worker running it."""
+
+
+class HistoryItem(BaseModel):
+    role: Literal["user", "assistant", "system", "tool"]
+    content: str
+
+
+class GenerationRequest(BaseModel):
+    """A single agent run."""
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    agent: str = "simple_agent"
+    prompt: str
+    history: list[HistoryItem] = Field(default_factory=list)
+    model: str | None = None
+    """Model override (pydantic-ai id), by default the agent's model is used."""
+    history_tokens: int | None = None
+    """Token count of the history, if known (cached per message branch)."""
+    user: str | None = None
+    """User (client token) the run acts for, the agent tools only see their files."""
+
+
+class GenerationEvent(BaseModel):
+    """A stream event of a generation.
+
+    "delta" events carry new text, the final "done" event carries the full message.
+    A "restart" event means the generation is run again from the start and the
+    text received so far is void.
+    """
+
+    kind: Literal["delta", "done", "error", "restart"]
+    content: str = ""
+    message: UIMessage | None = None
+
+
+def _channel(request_id: str) -> str:
+    return f"chat:generation:{request_id}"
+
+
+def _processing_key(worker_id: str) -> str:
+    return f"chat:generation:processing:{worker_id}"
+
+
+def _heartbeat_key(worker_id: str) -> str:
+    return f"chat:generation:worker:{worker_id}"
+
+
+@functools.cache
+def _redis() -> Redis | None:
+    # Created lazily so that every (forked) worker process gets its own pool.
+    from reflex.utils.prerequisites import get_redis
+
+    return get_redis() if settings.GENERATION_QUEUE else None
+
+
+async def run_generation(request: GenerationRequest) -> AsyncIterator[GenerationEvent]:
+    """Run the agent for given request in this process.
+
+    Args:
+        request: The generation request.
+    """
+    from llmling_agent import ChatMessage
+
+    # The history is sent unchanged and in order, so the prompt of each turn
+    # starts with the exact bytes of the previous one and hits provider caches.
+    history = [ChatMessage(content=i.content, role=i.role) for i in request.history]
+    async with warm_pool.acquire(request.agent) as agent:
+        # Tool calls run within the stream and see the user's files only.
+        user_token = current_user.set(request.user)
+        try:
+            async with agent.run_stream(
+                request.prompt, messages=history, model=request.model
+            ) as stream:
+                async for delta in stream.stream_text(delta=True):
+                    yield GenerationEvent(kind="delta", content=delta)
+                usage = stream.usage()
+        finally:
+            current_user.reset(user_token)
+        result = agent.conversation.chat_messages[-1]
+        message = UIMessage.from_chat_message(result)
+        message.html = render_markdown(message.content)
+        cached = (usage.details or {}).get("cached_tokens", 0) if usage else 0
+        if result.cost_info:
+            message.cost_info = CachedTokenCost.from_cost(result.cost_info, cached)
+        _record_usage(message, cached)
+        yield GenerationEvent(kind="done", content=message.content, message=message)
+
+
+def _record_usage(message: UIMessage, cached: int):
+    model = message.model or "unknown"
+    metrics.inc("chat_generations_total", model=model)
+    if message.cost_info:
+        usage = message.cost_info.token_usage
+        metrics.inc("chat_prompt_tokens_total", usage["prompt"], model=model)
+        metrics.inc("chat_prompt_cached_tokens_total", cached, model=model)
+        metrics.inc("chat_completion_tokens_total", usage["completion"], model=model)
+
+
+async def generate(request: GenerationRequest) -> AsyncIterator[GenerationEvent]:
+    """Stream the events of a generation, wherever it runs.
+
+    The request is routed to a model first (see `chat.routing`).
+
+    Args:
+        request: The generation request.
+
+    Raises:
+        GenerationError: If the run failed on the worker.
+        TimeoutError: If no event arrived within the configured timeout.
+    """
+    decision = await routing.route(request)
+    if decision and decision.applied:
+        request = request.model_copy(update={"model": decision.model})
+    start = time.perf_counter()
+    async for event in _dispatch(request):
+        if decision and event.message:
+            routing.record(decision, event.message, time.perf_counter() - start)
+        yield event
+
+
+async def _dispatch(request: GenerationRequest) -> AsyncIterator[GenerationEvent]:
+    redis = _redis()
+    if redis is None:
+        async for event in run_generation(request):
+            yield event
+        return
+
+    async with redis.pubsub() as pubsub:
+        # Subscribe before queueing so no event can be missed.
+        await pubsub.subscribe(_channel(request.id))
+        await redis.rpush(QUEUE_KEY, request.model_dump_json())
+        while True:
+            async with asyncio.timeout(settings.GENERATION_TIMEOUT):
+                msg = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=None
+                )
+            if msg is None:
+                continue
+            event = GenerationEvent.model_validate_json(msg["data"])
+            if event.kind == "error":
+                raise GenerationError(event.content)
+            yield event
+            if event.kind == "done":
+                return
+
+
+async def _serve(redis: Redis, request: GenerationRequest, processing: str, raw: str):
+    channel = _channel(request.id)
+    cancelled = False
+    try:
+        async for event in run_generation(request):
+            await redis.publish(channel, event.model_dump_json())
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    except Exception as e:
+        logger.exception("Generation %s failed", request.id)
+        error = GenerationEvent(kind="error", content=str(e))
+        await redis.publish(channel, error.model_dump_json())
+    finally:
+        if cancelled:
+            # Shutting down: another worker runs it again from the start.
+            logger.warning("Requeueing generation %s on shutdown", request.id)
+            restart = GenerationEvent(kind="restart").model_dump_json()
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.lrem(processing, 1, raw)
+                pipe.lpush(QUEUE_KEY, raw)
+                pipe.publish(channel, restart)
+                await pipe.execute()
+        else:
+            # Acknowledge: served (or failed for good), so it must not be rerun.
+            await redis.lrem(processing, 1, raw)
+
+
+async def _heartbeat(redis: Redis, worker_id: str):
+    """Keep this worker's heartbeat alive and take over requests of dead workers."""
+    ttl = settings.GENERATION_WORKER_TTL
+    while True:
+        try:
+            await redis.set(_heartbeat_key(worker_id), 1, px=int(ttl * 1000))
+            await _requeue_dead(redis)
+        except Exception:
+            # Retried soon enough: the key lives for three intervals.
+            logger.exception("Generation worker heartbeat failed")
+        await asyncio.sleep(ttl / 3)
+
+
+async def _requeue_dead(redis: Redis):
+    for member in await redis.smembers(WORKERS_KEY):  # type: ignore[misc]
+        worker_id = member if isinstance(member, str) else member.decode()
+        if await redis.exists(_heartbeat_key(worker_id)):
+            continue
+        processing = _processing_key(worker_id)
+        # LMOVE is atomic, so each request is taken over by exactly one worker.
+        while raw := await redis.lmove(processing, QUEUE_KEY, "RIGHT", "LEFT"):
+            request = GenerationRequest.model_validate_json(raw)
+            logger.warning("Requeued generation %s of dead worker", request.id)
+            restart = GenerationEvent(kind="restart")
+            await redis.publish(_channel(request.id), restart.model_dump_json())
+        await redis.srem(WORKERS_KEY, worker_id)  # type: ignore[misc]
+
+
+async def run_worker():
+    """Take generation requests from the queue, bounded by the per-worker concurrency.
+
+    Registered as lifespan task, so every backend worker process runs one.
+    """
+    if (redis := _redis()) is None:
+        return
+    worker_id = uuid.uuid4().hex
+    processing = _processing_key(worker_id)
+    await redis.set(
+        _heartbeat_key(worker_id), 1, px=int(settings.GENERATION_WORKER_TTL * 1000)
+    )
+    await redis.sadd(WORKERS_KEY, worker_id)  # type: ignore[misc]
+    heartbeat = asyncio.create_task(_heartbeat(redis, worker_id))
+    slots = asyncio.Semaphore(settings.GENERATION_CONCURRENCY)
+    running: set[asyncio.Task[None]] = set()
+    backoff = 1.0
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                raw = await redis.blmove(QUEUE_KEY, processing, 5, "LEFT", "RIGHT")
+            except Exception:
+                slots.release()
+                logger.exception("Taking a generation request failed")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            except BaseException:
+                slots.release()
+                raise
+            backoff = 1.0
+            if raw is None:
+                slots.release()
+                continue
+            raw = raw if isinstance(raw, str) else raw.decode()
+            request = GenerationRequest.model_validate_json(raw)
+            task = asyncio.create_task(_serve(redis, request, processing, raw))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        # The running requests requeue themselves when cancelled.
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        heartbeat.cancel()
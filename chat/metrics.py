@@ -0,0 +1,110 @@
+"""Process-local metrics, exposed in the Prometheus text format at /metrics.
+
+Metrics are per backend worker process; every sample carries the worker pid, so
+scrapes of several workers can be summed. Cluster-wide gauges (read from Redis,
+see `set_shared_gauge`) have no worker label instead: every worker reports the
+same value, so aggregate them with max, not sum.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Literal
+
+
+# Metric name -> (type, help text).
+METRICS: dict[str, tuple[Literal["counter", "gauge"], str]] = {
+    "chat_generations_total": ("counter", "Finished agent generations."),
+    "chat_prompt_tokens_total": ("counter", "Prompt tokens sent to the providers."),
+    "chat_prompt_cached_tokens_total": (
+        "counter",
+        "Prompt tokens served from provider caches.",
+    ),
+    "chat_completion_tokens_total": (
+        "counter",
+        "Completion tokens received from the providers.",
+    ),
+    "chat_sessions_live": (
+        "gauge",
+        "Sessions with activity in the idle period (all workers with Redis).",
+    ),
+    "chat_sessions_evicted": (
+        "gauge",
+        "Sessions shrunk to a stub (all workers with Redis).",
+    ),
+    "chat_sessions_evicted_total": ("counter", "Evictions of idle sessions."),
+    "chat_session_evicted_bytes_total": (
+        "counter",
+        "Approximate bytes of chat data dropped from evicted sessions.",
+    ),
+    "chat_state_memory_bytes": ("gauge", "Memory used by the Redis state store."),
+    "chat_route_decisions_total": ("counter", "Model routing decisions."),
+    "chat_route_generations_total": ("counter", "Finished generations per route."),
+    "chat_route_latency_seconds_total": (
+        "counter",
+        "Seconds until the final message, per route.",
+    ),
+    "chat_route_cost_usd_total": ("counter", "Generation cost in USD, per route."),
+}
+
+_values: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+# Keys of `_values` which are the same in every worker.
+_shared: set[tuple[str, tuple[tuple[str, str], ...]]] = set()
+
+
+def inc(name: str, value: float = 1, **labels: str):
+    """Increase a counter.
+
+    Args:
+        name: A metric name from `METRICS`.
+        value: The amount to add.
+        labels: Label values of the sample.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    _values[key] = _values.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels: str):
+    """Set the current value of a gauge.
+
+    Args:
+        name: A metric name from `METRICS`.
+        value: The new value.
+        labels: Label values of the sample.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    _values[key] = value
+    _shared.discard(key)
+
+
+def set_shared_gauge(name: str, value: float, **labels: str):
+    """Set a cluster-wide gauge, exported without the worker label.
+
+    Args:
+        name: A metric name from `METRICS`.
+        value: The new value.
+        labels: Label values of the sample.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    _values[key] = value
+    _shared.add(key)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    pid = str(os.getpid())
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        for (metric, labels), value in sorted(_values.items()):
+            if metric != name:
+                continue
+            shared = (metric, labels) in _shared
+            pairs = [*labels] if shared else [*labels, ("worker", pid)]
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in pairs)
+            lines.append(f"{name}{{{label_text}}} {value:g}")
+    return "\n".join(lines) + "\n"
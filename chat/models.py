@@ -0,0 +1,67 @@
+"""Serializable chat data models."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime  # noqa: TC003
+from typing import Any, Literal, NotRequired
+import uuid
+
+from llmling_agent import ChatMessage, ToolCallInfo  # noqa: TC002
+from llmling_agent.messaging.messages import TokenCost, TokenUsage
+from pydantic import BaseModel, Field
+
+
+class CachedTokenUsage(TokenUsage):
+    cached: NotRequired[int]
+    """Prompt tokens served from the provider's prompt cache."""
+
+
+@dataclass(frozen=True)
+class CachedTokenCost(TokenCost):
+    """Token cost which also keeps the prompt cache hits."""
+
+    token_usage: CachedTokenUsage
+
+    @classmethod
+    def from_cost(cls, cost: TokenCost, cached: int = 0) -> CachedTokenCost:
+        """Add the number of cached prompt tokens to a `TokenCost`."""
+        usage = CachedTokenUsage(**cost.token_usage, cached=cached)
+        return cls(token_usage=usage, total_cost=cost.total_cost)
+
+
+class UIMessage(BaseModel):
+    """A serializable message for the UI with pre-formatted display fields."""
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    role: Literal["user", "assistant", "system", "tool"]
+    content: str
+    model: str | None = None
+    timestamp: datetime | None = None
+    cost_info: CachedTokenCost | None = None
+    response_time: float | None = None
+    tool_calls: list[ToolCallInfo] = Field(default_factory=list)
+    name: str | None = None
+    metadata: dict[str, Any] = Field(default_factory=dict)
+    html: str | None = None
+    """Server-rendered content, set once the message is final."""
+    parent_id: str | None = None
+    """The previous message of the branch, None for the first one of a chat."""
+    branch_tokens: int | None = None
+    """Tokens of the branch up to and including this message, if known."""
+
+    @classmethod
+    def from_chat_message(cls, message: ChatMessage) -> UIMessage:
+        """Convert a ChatMessage to a UIMessage."""
+        return cls(
+            id=message.message_id,
+            role=message.role,
+            content=str(message.content),
+            model=message.model,
+            timestamp=message.timestamp,
+            cost_info=message.cost_info and CachedTokenCost.from_cost(message.cost_info),
+            response_time=message.response_time,
+            tool_calls=message.tool_calls,
+            name=message.name,
+            metadata=message.metadata,
+        )
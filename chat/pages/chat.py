@@ -8,7 +8,7 @@ from chat.state import State  # Import the state directly
 from chat.template import with_template
 
 
-@rx.page(route="/chat")
+@rx.page(route="/chat", on_load=State.hydrate)
 @with_template
 def chat_page() -> rx.Component:
     """Chat page showing the chat interface."""
@@ -19,13 +19,13 @@ def chat_page() -> rx.Component:
                 width="100%",
             ),
             rx.cond(
-                State.chats[State.current_chat].length() == 0,
+                State.messages.length() == 0,
                 templates(),
                 rx.fragment(),
             ),
             rx.box(
                 rx.foreach(
-                    State.chats[State.current_chat],
+                    State.messages,
                     chat.message_exchange,
                 ),
                 width="100%",
@@ -0,0 +1,64 @@
+"""Server-side markdown rendering for finalized messages."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import functools
+import hashlib
+from typing import TYPE_CHECKING
+
+from chat import settings
+
+
+if TYPE_CHECKING:
+    from markdown_it import MarkdownIt
+
+
+# Pygments style for code blocks, rendered as inline styles.
+CODE_STYLE = "monokai"
+
+_cache: OrderedDict[str, str] = OrderedDict()
+
+
+def _highlight(code: str, lang: str, _attrs: str) -> str:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import TextLexer, get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    try:
+        lexer = get_lexer_by_name(lang) if lang else TextLexer()
+    except ClassNotFound:
+        lexer = TextLexer()
+    # nowrap: markdown-it wraps the result in <pre><code>.
+    return highlight(
+        code, lexer, HtmlFormatter(noclasses=True, nowrap=True, style=CODE_STYLE)
+    )
+
+
+@functools.cache
+def _markdown() -> MarkdownIt:
+    from markdown_it import MarkdownIt
+
+    # Raw HTML in messages is escaped, unsafe link schemes are rejected.
+    return MarkdownIt("default", {"html": False, "highlight": _highlight})
+
+
+def render_markdown(content: str) -> str:
+    """Render markdown to sanitized HTML, cached by content hash (LRU).
+
+    Args:
+        content: The markdown text.
+
+    Returns:
+        The HTML fragment.
+    """
+    key = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+    if (html := _cache.get(key)) is not None:
+        _cache.move_to_end(key)
+        return html
+    html = _markdown().render(content)
+    _cache[key] = html
+    if len(_cache) > settings.MARKDOWN_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return html
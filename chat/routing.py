@@ -0,0 +1,329 @@
+"""Route each prompt to the cheapest model which can handle it.
+
+A prompt is first checked against a few rules (code, very short questions),
+otherwise a small classifier over hashed word features assigns one of the
+`TIERS`. Among the candidate models of that tier, the one with the lowest
+expected cost whose context window fits the conversation is used. Context
+windows and prices come from the tokonomics catalog (the model selector's data),
+prices it does not have (e.g. for OpenAI) from `PRICES`.
+
+`CHAT_ROUTER_MODE` selects the behavior: "off", "shadow" (decide and record,
+but keep the agent's model) or "on". Decisions are stored in the metadata of
+the answer and counted in /metrics together with latency and cost per route.
+
+The classifier is trained offline from labelled prompts, e.g. logged traffic
+exported via `/api/chats/export` with the recorded shadow decisions corrected:
+`python -m chat.routing train labelled.jsonl` (lines of `{"prompt", "tier"}`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import math
+from pathlib import Path
+import re
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Literal
+
+import numpy as np
+from pydantic import BaseModel
+
+from chat import metrics, settings
+from chat.branches import CHARS_PER_TOKEN
+from chat.documents import HashingEmbedder
+
+
+if TYPE_CHECKING:
+    from tokonomics.model_discovery import ModelInfo
+
+    from chat.generation import GenerationRequest
+    from chat.models import UIMessage
+
+
+logger = logging.getLogger(__name__)
+
+Tier = Literal["light", "standard", "heavy"]
+TIERS: tuple[Tier, ...] = ("light", "standard", "heavy")
+
+# Candidate models (pydantic-ai ids) per tier, cheapest first (the order decides
+# between models without a known price). Tiers without a fitting model escalate
+# to the next one.
+TIER_MODELS: dict[Tier, list[str]] = {
+    "light": ["openai:gpt-4.1-nano", "openai:gpt-4o-mini"],
+    "standard": ["openai:gpt-4o-mini", "openai:gpt-4.1-mini"],
+    "heavy": ["openai:gpt-4.1", "openai:gpt-4o"],
+}
+
+# USD per prompt and completion token (list prices), for models whose price is
+# missing in the catalog.
+PRICES: dict[str, tuple[float, float]] = {
+    "openai:gpt-4.1-nano": (0.10e-6, 0.40e-6),
+    "openai:gpt-4o-mini": (0.15e-6, 0.60e-6),
+    "openai:gpt-4.1-mini": (0.40e-6, 1.60e-6),
+    "openai:gpt-4.1": (2.00e-6, 8.00e-6),
+    "openai:gpt-4o": (2.50e-6, 10.00e-6),
+}
+
+# Seconds until fetching the catalog is tried again after it failed.
+CATALOG_RETRY_SECONDS = 300
+
+# Completion tokens assumed for the cost estimate and context window check.
+EXPECTED_COMPLETION_TOKENS = 500
+SHORT_PROMPT_WORDS = 6
+
+_CODE = re.compile(
+    r"```|Traceback \(most recent call last\)|^\s*(def|class|import) ", re.M
+)
+
+
+class RouteDecision(BaseModel):
+    tier: Tier
+    model: str | None
+    """The routed model, None if no candidate fits (the agent's model is used)."""
+    reason: str
+    """"rule:<name>", "classifier" or "default"."""
+    confidence: float = 1.0
+    applied: bool = False
+    """Whether the request runs on `model` (False in shadow mode)."""
+
+
+class TierClassifier:
+    """Softmax regression over hashed word features and the prompt length."""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray):
+        self.weights = weights
+        self.bias = bias
+        self.embedder = HashingEmbedder(weights.shape[0] - 1)
+
+    def features(self, texts: list[str]) -> np.ndarray:
+        lengths = np.array([[math.log1p(len(t.split())) / 10] for t in texts])
+        return np.hstack([self.embedder.embed(texts), lengths.astype(np.float32)])
+
+    def predict(self, texts: list[str]) -> list[tuple[Tier, float]]:
+        """Get the most likely tier and its probability for each text."""
+        probs = _softmax(self.features(texts) @ self.weights + self.bias)
+        return [(TIERS[i], float(p[i])) for i, p in zip(probs.argmax(1), probs)]
+
+    @classmethod
+    def fit(
+        cls,
+        texts: list[str],
+        tiers: list[Tier],
+        dim: int = 512,
+        epochs: int = 300,
+        learning_rate: float = 1.0,
+        l2: float = 1e-4,
+    ) -> TierClassifier:
+        """Train by full-batch gradient descent on the cross-entropy.
+
+        Args:
+            texts: The prompts.
+            tiers: The tier of each prompt.
+            dim: Number of hashed word features.
+            epochs: Gradient descent steps.
+            learning_rate: Step size.
+            l2: Weight decay.
+        """
+        model = cls(
+            np.zeros((dim + 1, len(TIERS)), np.float32),
+            np.zeros(len(TIERS), np.float32),
+        )
+        x = model.features(texts)
+        y = np.eye(len(TIERS), dtype=np.float32)[[TIERS.index(t) for t in tiers]]
+        for _ in range(epochs):
+            grad = (_softmax(x @ model.weights + model.bias) - y) / len(texts)
+            model.weights -= learning_rate * (x.T @ grad + l2 * model.weights)
+            model.bias -= learning_rate * grad.sum(0)
+        return model
+
+    def save(self, path: str | Path):
+        with Path(path).open("wb") as f:
+            np.savez(f, weights=self.weights, bias=self.bias)
+
+    @classmethod
+    def load(cls, path: str | Path) -> TierClassifier:
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"])
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+@functools.cache
+def _classifier() -> TierClassifier | None:
+    path = Path(settings.ROUTER_MODEL_PATH)
+    if not path.exists():
+        logger.info("No router model at %s, routing by rules only", path)
+        return None
+    return TierClassifier.load(path)
+
+
+_catalog_lock = threading.Lock()
+_catalog_cache: dict[str, ModelInfo] = {}
+_catalog_failed = -math.inf
+
+
+def _catalog() -> dict[str, ModelInfo]:
+    """Get the catalog entries of the candidate models, empty if unavailable.
+
+    Only a successful fetch is kept, a failed one is retried after a while.
+    """
+    global _catalog_failed
+    from tokonomics.model_discovery import get_all_models_sync
+
+    with _catalog_lock:
+        if _catalog_cache or time.monotonic() - _catalog_failed < CATALOG_RETRY_SECONDS:
+            return _catalog_cache
+        model_ids = {model for models in TIER_MODELS.values() for model in models}
+        providers = sorted({model.split(":", 1)[0] for model in model_ids})
+        try:
+            models = get_all_models_sync(providers=providers)  # type: ignore[arg-type]
+        except Exception:
+            logger.exception("Fetching the model catalog failed")
+            models = []
+        found = {m.pydantic_ai_id: m for m in models if m.pydantic_ai_id in model_ids}
+        if found:
+            _catalog_cache.update(found)
+        else:
+            logger.warning("No model catalog, routing by prices and order only")
+            _catalog_failed = time.monotonic()
+        return _catalog_cache
+
+
+def classify(prompt: str) -> tuple[Tier, str, float]:
+    """Assign a tier to a prompt.
+
+    Returns:
+        The tier, the reason and the classifier confidence.
+    """
+    if _CODE.search(prompt):
+        return "heavy", "rule:code", 1.0
+    if len(prompt.split()) <= SHORT_PROMPT_WORDS and "\n" not in prompt:
+        return "light", "rule:short", 1.0
+    if (classifier := _classifier()) is not None:
+        tier, confidence = classifier.predict([prompt])[0]
+        if confidence >= settings.ROUTER_MIN_CONFIDENCE:
+            return tier, "classifier", confidence
+        return max(tier, "standard", key=TIERS.index), "classifier", confidence
+    return "standard", "default", 1.0
+
+
+def choose_model(tier: Tier, tokens: int, catalog: dict[str, ModelInfo]) -> str | None:
+    """Get the cheapest candidate of a tier (or above) that fits `tokens`."""
+    needed = tokens + EXPECTED_COMPLETION_TOKENS
+    for candidate_tier in TIERS[TIERS.index(tier) :]:
+        candidates = []
+        for position, model in enumerate(TIER_MODELS[candidate_tier]):
+            info = catalog.get(model)
+            if info and info.context_window and info.context_window < needed:
+                continue
+            candidates.append((_expected_cost(model, info, tokens), position, model))
+        if candidates:
+            return min(candidates)[2]
+    return None
+
+
+def _expected_cost(model: str, info: ModelInfo | None, tokens: int) -> float:
+    pricing = info and info.pricing
+    if pricing and pricing.prompt is not None and pricing.completion is not None:
+        prompt, completion = pricing.prompt, pricing.completion
+    elif model in PRICES:
+        prompt, completion = PRICES[model]
+    else:
+        return math.inf  # unknown models only win within their tier's order
+    return prompt * tokens + completion * EXPECTED_COMPLETION_TOKENS
+
+
+async def route(request: GenerationRequest) -> RouteDecision | None:
+    """Decide the model of a request, None if routing is off.
+
+    Args:
+        request: The generation request.
+    """
+    if settings.ROUTER_MODE == "off" or request.model:
+        return None
+    tier, reason, confidence = classify(request.prompt)
+    if request.history_tokens is not None:
+        tokens = request.history_tokens + len(request.prompt) // CHARS_PER_TOKEN
+    else:
+        chars = len(request.prompt) + sum(len(i.content) for i in request.history)
+        tokens = chars // CHARS_PER_TOKEN
+    catalog = await asyncio.to_thread(_catalog)
+    decision = RouteDecision(
+        tier=tier,
+        model=choose_model(tier, tokens, catalog),
+        reason=reason,
+        confidence=confidence,
+    )
+    decision.applied = settings.ROUTER_MODE == "on" and decision.model is not None
+    metrics.inc(
+        "chat_route_decisions_total",
+        tier=tier,
+        model=decision.model or "default",
+        reason=reason,
+        mode=settings.ROUTER_MODE,
+    )
+    logger.debug("Routed %s: %s", request.id, decision)
+    return decision
+
+
+def record(decision: RouteDecision, message: UIMessage, latency: float):
+    """Count latency and cost of a finished generation under its route."""
+    labels = {"tier": decision.tier, "model": message.model or "unknown"}
+    metrics.inc("chat_route_generations_total", **labels)
+    metrics.inc("chat_route_latency_seconds_total", latency, **labels)
+    if message.cost_info:
+        metrics.inc("chat_route_cost_usd_total", message.cost_info.total_cost, **labels)
+    message.metadata["route"] = decision.model_dump()
+
+
+def train(input_path: Path, output_path: Path, dim: int, epochs: int) -> str:
+    """Train the classifier on a JSONL file of `{"prompt", "tier"}` lines."""
+    texts: list[str] = []
+    tiers: list[Tier] = []
+    with input_path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                texts.append(data["prompt"])
+                tiers.append(data["tier"])
+    classifier = TierClassifier.fit(texts, tiers, dim=dim, epochs=epochs)
+    classifier.save(output_path)
+    predicted = [tier for tier, _ in classifier.predict(texts)]
+    accuracy = sum(p == t for p, t in zip(predicted, tiers)) / max(len(tiers), 1)
+    return f"trained on {len(texts)} prompts, training accuracy {accuracy:.1%}"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train the prompt classifier")
+    train_parser.add_argument("input", type=Path, help="JSONL of {prompt, tier}")
+    train_parser.add_argument(
+        "--output", type=Path, default=Path(settings.ROUTER_MODEL_PATH)
+    )
+    train_parser.add_argument("--dim", type=int, default=512)
+    train_parser.add_argument("--epochs", type=int, default=300)
+    classify_parser = commands.add_parser("classify", help="show the tier of prompts")
+    classify_parser.add_argument("prompts", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        print(train(args.input, args.output, args.dim, args.epochs), file=sys.stderr)
+        return 0
+    for prompt in args.prompts:
+        tier, reason, confidence = classify(prompt)
+        print(f"{tier}\t{reason}\t{confidence:.2f}\t{prompt}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
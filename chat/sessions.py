@@ -0,0 +1,181 @@
+"""Idle session lifecycle: evict the chat data of inactive sessions.
+
+Every event marks its session as active. A sweeper running in each backend
+worker finds sessions idle for longer than `CHAT_SESSION_IDLE_SECONDS` and
+shrinks their `State` to a stub (the current chat name), dropping the cached
+messages. All finalized messages are already in the chat store, so nothing is
+lost; the next event of the session loads the current chat again.
+
+With Redis, activity is tracked in a sorted set shared by all workers, otherwise
+in this process (matching Reflex' in-memory state manager). Evicted sessions are
+remembered for as long as a state lives (`redis_token_expiration`); sessions
+whose state expired in the meantime are not evicted at all.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from reflex.config import get_config
+from reflex.middleware import Middleware
+from reflex.state import StateManagerDisk, StateManagerRedis
+
+from chat import metrics, settings
+from chat.state import State
+
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+    import reflex as rx
+    from reflex.event import Event
+    from reflex.state import BaseState, StateUpdate
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_KEY = "chat:sessions"
+# Sorted set of the evicted sessions by eviction time.
+EVICTED_KEY = "chat:sessions:stubs"
+
+
+@functools.cache
+def _redis() -> Redis | None:
+    from reflex.utils.prerequisites import get_redis
+
+    return get_redis()
+
+
+class SessionTracker:
+    """Last activity of the sessions and which of them are evicted."""
+
+    def __init__(self):
+        self._active: dict[str, float] = {}
+        self._evicted: dict[str, float] = {}
+
+    async def touch(self, token: str) -> bool:
+        """Mark a session as active.
+
+        Returns:
+            Whether the session was evicted and needs to be rehydrated.
+        """
+        now = time.time()
+        if (redis := _redis()) is None:
+            self._active[token] = now
+            return self._evicted.pop(token, None) is not None
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(ACTIVE_KEY, {token: now})
+            pipe.zrem(EVICTED_KEY, token)
+            _, evicted = await pipe.execute()
+        return bool(evicted)
+
+    async def claim_idle(self, idle_seconds: float) -> list[str]:
+        """Take the sessions idle for longer than given seconds off the active set.
+
+        Each idle session is claimed by exactly one worker.
+        """
+        cutoff = time.time() - idle_seconds
+        if (redis := _redis()) is None:
+            idle = [token for token, seen in self._active.items() if seen < cutoff]
+            for token in idle:
+                del self._active[token]
+            return idle
+        candidates = await redis.zrangebyscore(ACTIVE_KEY, "-inf", cutoff)
+        # ZREM only succeeds in one worker, which then owns the eviction.
+        return [
+            token if isinstance(token, str) else token.decode()
+            for token in candidates
+            if await redis.zrem(ACTIVE_KEY, token)
+        ]
+
+    async def mark_evicted(self, token: str):
+        if (redis := _redis()) is None:
+            self._evicted[token] = time.time()
+        else:
+            await redis.zadd(EVICTED_KEY, {token: time.time()})
+
+    async def expire(self):
+        """Forget evicted sessions whose state expired by now."""
+        cutoff = time.time() - get_config().redis_token_expiration
+        if (redis := _redis()) is None:
+            for token in [t for t, at in self._evicted.items() if at < cutoff]:
+                del self._evicted[token]
+        else:
+            await redis.zremrangebyscore(EVICTED_KEY, "-inf", cutoff)
+
+    async def update_metrics(self, idle_seconds: float):
+        """Refresh the session gauges."""
+        if (redis := _redis()) is None:
+            metrics.set_gauge("chat_sessions_live", len(self._active))
+            metrics.set_gauge("chat_sessions_evicted", len(self._evicted))
+            return
+        # Read from Redis, so the same in all workers.
+        cutoff = time.time() - idle_seconds
+        metrics.set_shared_gauge(
+            "chat_sessions_live", await redis.zcount(ACTIVE_KEY, cutoff, "+inf")
+        )
+        metrics.set_shared_gauge("chat_sessions_evicted", await redis.zcard(EVICTED_KEY))
+        memory = await redis.info("memory")
+        metrics.set_shared_gauge("chat_state_memory_bytes", memory["used_memory"])
+
+
+tracker = SessionTracker()
+
+
+class SessionMiddleware(Middleware):
+    """Records session activity and rehydrates evicted sessions."""
+
+    async def preprocess(
+        self, app: rx.App, state: BaseState, event: Event
+    ) -> StateUpdate | None:
+        if await tracker.touch(state.router.session.client_token):
+            chat_state = await state.get_state(State)
+            await chat_state.rehydrate()
+        return None
+
+    async def postprocess(
+        self, app: rx.App, state: BaseState, event: Event, update: StateUpdate
+    ) -> StateUpdate:
+        return update
+
+
+async def _state_exists(app: rx.App, token: str, key: str) -> bool:
+    manager = app.state_manager
+    if isinstance(manager, StateManagerRedis):
+        return bool(await manager.redis.exists(key))
+    if isinstance(manager, StateManagerDisk):
+        return token in manager.states or manager.token_path(key).exists()
+    return token in getattr(manager, "states", {})
+
+
+async def evict(app: rx.App, token: str):
+    """Shrink the state of a session to a stub."""
+    key = f"{token}_{State.get_full_name()}"
+    # An expired state would be created anew (and empty) by `modify_state`.
+    if not await _state_exists(app, token, key):
+        return
+    # Via the state manager (not `app.modify_state`): nothing is sent to a
+    # possibly still open tab, which keeps showing its messages.
+    async with app.state_manager.modify_state(key) as root:
+        chat_state = await root.get_state(State)
+        freed = chat_state.evict()
+    await tracker.mark_evicted(token)
+    metrics.inc("chat_sessions_evicted_total")
+    metrics.inc("chat_session_evicted_bytes_total", freed)
+
+
+async def run_evictor(reflex_app: rx.App):
+    """Lifespan task: periodically evict idle sessions."""
+    idle = settings.SESSION_IDLE_SECONDS
+    while True:
+        await asyncio.sleep(settings.SESSION_SWEEP_INTERVAL)
+        try:
+            for token in await tracker.claim_idle(idle):
+                await evict(reflex_app, token)
+            await tracker.expire()
+            await tracker.update_metrics(idle)
+        except Exception:
+            logger.exception("Session eviction failed")
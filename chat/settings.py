@@ -0,0 +1,92 @@
+"""Deployment settings read from the environment."""
+
+from __future__ import annotations
+
+import os
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# Number of pre-instantiated copies per agent from agents.yml.
+WARMUP_AGENT_INSTANCES = _int("CHAT_WARMUP_AGENT_INSTANCES", 2)
+# Upper bound of copies per agent; further runs wait for a copy to be returned.
+WARMUP_AGENT_MAX_INSTANCES = _int("CHAT_WARMUP_AGENT_MAX_INSTANCES", 8)
+# Seconds between keep-alive pings on pre-opened provider / Jira connections.
+WARMUP_PING_INTERVAL = _float("CHAT_WARMUP_PING_INTERVAL", 30.0)
+# Run agent streams through the Redis generation queue (needs REDIS_URL).
+GENERATION_QUEUE = os.getenv("CHAT_GENERATION_QUEUE", "1") == "1"
+# Concurrent generations each backend worker takes from the queue.
+GENERATION_CONCURRENCY = _int("CHAT_GENERATION_CONCURRENCY", 8)
+# Seconds without any stream event before a queued generation is given up.
+GENERATION_TIMEOUT = _float("CHAT_GENERATION_TIMEOUT", 120.0)
+# Seconds after which the queued requests of a silent worker are taken over.
+GENERATION_WORKER_TTL = _float("CHAT_GENERATION_WORKER_TTL", 30.0)
+# Minimum seconds between two state updates of a streaming answer.
+STREAM_APPLY_INTERVAL = _float("CHAT_STREAM_APPLY_INTERVAL", 0.05)
+# Number of rendered messages kept in the server-side markdown cache.
+MARKDOWN_CACHE_SIZE = _int("CHAT_MARKDOWN_CACHE_SIZE", 4096)
+# SQLite database with finalized messages and the search index.
+STORE_PATH = os.getenv("CHAT_STORE_PATH", "chat.db")
+# Number of search results per page.
+SEARCH_PAGE_SIZE = _int("CHAT_SEARCH_PAGE_SIZE", 20)
+# Directory of the document retrieval index.
+DOCUMENTS_DIR = os.getenv("CHAT_DOCUMENTS_DIR", "documents_index")
+# Dimension of the hashed document embeddings.
+DOCUMENTS_EMBED_DIM = _int("CHAT_DOCUMENTS_EMBED_DIM", 512)
+# Characters per chunk and overlap between neighbouring chunks.
+DOCUMENTS_CHUNK_SIZE = _int("CHAT_DOCUMENTS_CHUNK_SIZE", 1200)
+DOCUMENTS_OVERLAP = _int("CHAT_DOCUMENTS_OVERLAP", 200)
+# Chunks embedded per batch.
+DOCUMENTS_BATCH_SIZE = _int("CHAT_DOCUMENTS_BATCH_SIZE", 64)
+# Maximum passages one `search_documents` call returns.
+DOCUMENTS_MAX_RESULTS = _int("CHAT_DOCUMENTS_MAX_RESULTS", 20)
+# Upload store limits: per file and for all stored objects together.
+UPLOAD_MAX_FILE_BYTES = _int("CHAT_UPLOAD_MAX_FILE_BYTES", 100 * 1024**2)
+UPLOAD_QUOTA_BYTES = _int("CHAT_UPLOAD_QUOTA_BYTES", 10 * 1024**3)
+# Size of the chunks written to the upload store.
+UPLOAD_CHUNK_SIZE = _int("CHAT_UPLOAD_CHUNK_SIZE", 1024**2)
+# Messages inserted per transaction when importing chats.
+TRANSFER_BATCH_SIZE = _int("CHAT_TRANSFER_BATCH_SIZE", 1000)
+# Chats per export page, and the longest accepted line of an import.
+TRANSFER_PAGE_SIZE = _int("CHAT_TRANSFER_PAGE_SIZE", 1000)
+TRANSFER_MAX_LINE_BYTES = _int("CHAT_TRANSFER_MAX_LINE_BYTES", 16 * 1024**2)
+# Most bytes one decompression step of an import may produce.
+TRANSFER_MAX_OUTPUT_BYTES = _int("CHAT_TRANSFER_MAX_OUTPUT_BYTES", 1024**2)
+# Bearer token required by the HTTP API (unset: the API is disabled).
+API_KEY = os.getenv("CHAT_API_KEY")
+# Speech-to-text engine class for voice input, and its Whisper model size.
+# The Whisper engine needs the `voice` extra (faster-whisper).
+STT_ENGINE = os.getenv("CHAT_STT_ENGINE", "chat.speech.WhisperEngine")
+STT_MODEL = os.getenv("CHAT_STT_MODEL", "base")
+# Processes transcribing voice input.
+STT_WORKERS = _int("CHAT_STT_WORKERS", 2)
+# A phrase ends after this many milliseconds below the (RMS) level, or at the
+# maximum length; its audio is transcribed as a whole.
+STT_PAUSE_MS = _int("CHAT_STT_PAUSE_MS", 300)
+STT_PAUSE_LEVEL = _float("CHAT_STT_PAUSE_LEVEL", 0.01)
+STT_MAX_PHRASE_SECONDS = _float("CHAT_STT_MAX_PHRASE_SECONDS", 20.0)
+# Milliseconds of audio per recorded chunk, bounds the transcript latency.
+VOICE_CHUNK_MS = _int("CHAT_VOICE_CHUNK_MS", 1000)
+# Chats per sidebar page.
+SIDEBAR_PAGE_SIZE = _int("CHAT_SIDEBAR_PAGE_SIZE", 50)
+# Latest messages loaded when opening a chat, and opened chats kept per session.
+CHAT_PAGE_SIZE = _int("CHAT_PAGE_SIZE", 100)
+CHAT_CACHE_SIZE = _int("CHAT_CACHE_SIZE", 20)
+# Smallest websocket message (bytes) sent compressed on the event channel.
+WS_DEFLATE_MIN_SIZE = _int("CHAT_WS_DEFLATE_MIN_SIZE", 512)
+# Seconds without events after which a session's chat data is evicted, and how
+# often the backend checks for idle sessions.
+SESSION_IDLE_SECONDS = _int("CHAT_SESSION_IDLE_SECONDS", 1800)
+SESSION_SWEEP_INTERVAL = _int("CHAT_SESSION_SWEEP_INTERVAL", 60)
+# Model routing: "off", "shadow" (only record decisions) or "on".
+ROUTER_MODE = os.getenv("CHAT_ROUTER_MODE", "off")
+# Trained prompt classifier (see chat/routing.py), and the probability below
+# which a prediction escalates to at least the "standard" tier.
+ROUTER_MODEL_PATH = os.getenv("CHAT_ROUTER_MODEL_PATH", "router.npz")
+ROUTER_MIN_CONFIDENCE = _float("CHAT_ROUTER_MIN_CONFIDENCE", 0.6)
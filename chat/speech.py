@@ -0,0 +1,195 @@
+"""Incremental speech-to-text for voice questions.
+
+The browser records short WAV chunks. The audio of the current phrase is
+transcribed again as chunks arrive, so the transcript grows while the user speaks
+and words are not cut at chunk boundaries; a phrase ends at a pause. Engines run
+in a process pool, keeping CPU-bound inference off the event loop and out of the
+GIL.
+
+Engines are pluggable: `CHAT_STT_ENGINE` names a class implementing
+`SpeechEngine`, instantiated once per worker process. The default Whisper engine
+needs the `voice` extra (`faster-whisper`); without a loadable engine, voice
+input is not offered.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import functools
+import importlib
+import io
+import logging
+import multiprocessing
+from typing import NamedTuple, Protocol
+import wave
+
+import numpy as np
+
+from chat import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class SpeechUnavailableError(Exception):
+    """Raised when the speech engine can not be loaded."""
+
+
+class SpeechEngine(Protocol):
+    def transcribe(self, audio: bytes, mime_type: str) -> str:
+        """Transcribe a self-contained audio chunk (e.g. a WAV file)."""
+        ...
+
+
+class FakeEngine:
+    """Deterministic engine for tests: one word per second of WAV audio."""
+
+    def transcribe(self, audio: bytes, mime_type: str) -> str:
+        try:
+            with wave.open(io.BytesIO(audio)) as f:
+                seconds = f.getnframes() / f.getframerate()
+        except (wave.Error, EOFError):
+            seconds = len(audio) / 16_000
+        return " ".join(["word"] * max(round(seconds), 1))
+
+
+class WhisperEngine:
+    """Local Whisper model via the optional `faster-whisper` package."""
+
+    def __init__(self, model: str | None = None):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            model or settings.STT_MODEL, device="cpu", compute_type="int8"
+        )
+
+    def transcribe(self, audio: bytes, mime_type: str) -> str:
+        segments, _ = self.model.transcribe(io.BytesIO(audio), vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+_engine: SpeechEngine | None = None
+
+
+def _load_engine(path: str):
+    # Runs once in every worker process.
+    global _engine
+    module, _, name = path.rpartition(".")
+    _engine = getattr(importlib.import_module(module), name)()
+
+
+def _transcribe(audio: bytes, mime_type: str) -> str:
+    assert _engine is not None
+    return _engine.transcribe(audio, mime_type)
+
+
+def _ready() -> bool:
+    return _engine is not None
+
+
+@functools.cache
+def _executor() -> ProcessPoolExecutor:
+    # Spawn instead of fork: the server process runs threads and an event loop.
+    return ProcessPoolExecutor(
+        max_workers=settings.STT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_load_engine,
+        initargs=(settings.STT_ENGINE,),
+    )
+
+
+_available: bool | None = None
+
+
+async def available() -> bool:
+    """Whether the speech engine loads, checked once by starting the worker pool."""
+    global _available
+    if _available is None:
+        try:
+            await _run(_ready)
+        except SpeechUnavailableError:
+            logger.exception("Speech engine %s failed to load", settings.STT_ENGINE)
+            _available = False
+        else:
+            _available = True
+    return _available
+
+
+async def transcribe(audio: bytes, mime_type: str = "audio/wav") -> str:
+    """Transcribe an audio chunk in the speech worker pool.
+
+    Args:
+        audio: The encoded audio chunk.
+        mime_type: The audio format.
+
+    Returns:
+        The recognized text, empty for silence.
+
+    Raises:
+        SpeechUnavailableError: If the engine failed to load.
+    """
+    return await _run(_transcribe, audio, mime_type)
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor(), func, *args)
+    except BrokenProcessPool as e:
+        # E.g. the engine failed to load in a worker: start a new pool next time.
+        shutdown()
+        raise SpeechUnavailableError(str(e)) from e
+
+
+class AudioFormat(NamedTuple):
+    channels: int
+    sample_width: int
+    frame_rate: int
+
+
+def read_wav(audio: bytes) -> tuple[AudioFormat, bytes]:
+    """Split a WAV file into its format and PCM frames.
+
+    Raises:
+        wave.Error: If the audio is no PCM WAV file.
+    """
+    with wave.open(io.BytesIO(audio)) as f:
+        audio_format = AudioFormat(f.getnchannels(), f.getsampwidth(), f.getframerate())
+        return audio_format, f.readframes(f.getnframes())
+
+
+def write_wav(audio_format: AudioFormat, frames: bytes) -> bytes:
+    """Build a WAV file from PCM frames."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(audio_format.channels)
+        f.setsampwidth(audio_format.sample_width)
+        f.setframerate(audio_format.frame_rate)
+        f.writeframes(frames)
+    return buffer.getvalue()
+
+
+def duration(audio_format: AudioFormat, frames: bytes) -> float:
+    """Seconds of audio in PCM frames."""
+    frame_size = audio_format.channels * audio_format.sample_width
+    return len(frames) / frame_size / audio_format.frame_rate
+
+
+def ends_in_pause(audio_format: AudioFormat, frames: bytes) -> bool:
+    """Whether the last `STT_PAUSE_MS` of 16 bit PCM audio are (nearly) silent."""
+    if audio_format.sample_width != 2:  # noqa: PLR2004
+        return False
+    tail_frames = audio_format.frame_rate * settings.STT_PAUSE_MS // 1000
+    if not (tail := frames[-tail_frames * audio_format.channels * 2 :]):
+        return False
+    samples = np.frombuffer(tail, np.int16).astype(np.float32) / 32768
+    return float(np.sqrt(np.mean(samples**2))) < settings.STT_PAUSE_LEVEL
+
+
+def shutdown():
+    """Stop the worker processes, if they were started."""
+    if _executor.cache_info().currsize:
+        _executor().shutdown(cancel_futures=True)
+        _executor.cache_clear()
@@ -2,73 +2,62 @@
 
 from __future__ import annotations
 
-from datetime import datetime  # noqa: TC003
-from typing import Any, Literal
-import uuid
+import asyncio
+import time
+from typing import Any
 
-from llmling_agent import ChatMessage, ToolCallInfo  # noqa: TC002
-from llmling_agent.messaging.messages import TokenCost  # noqa: TC002
-from pydantic import BaseModel, Field
 import reflex as rx
-import reflexions as rfx
-
-from chat.agents import pool
-
-
-class UIMessage(BaseModel):
-    """A serializable message for the UI with pre-formatted display fields."""
-
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    role: Literal["user", "assistant", "system", "tool"]
-    content: str
-    model: str | None = None
-    timestamp: datetime | None = None
-    cost_info: TokenCost | None = None
-    response_time: float | None = None
-    tool_calls: list[ToolCallInfo] = Field(default_factory=list)
-    name: str | None = None
-    metadata: dict[str, Any] = Field(default_factory=dict)
-
-    @classmethod
-    def from_chat_message(cls, message: ChatMessage) -> UIMessage:
-        """Convert a ChatMessage to a UIMessage."""
-        return cls(
-            id=message.message_id,
-            role=message.role,
-            content=str(message.content),
-            model=message.model,
-            timestamp=message.timestamp,
-            cost_info=message.cost_info,
-            response_time=message.response_time,
-            tool_calls=message.tool_calls,
-            name=message.name,
-            metadata=message.metadata,
-        )
+
+from chat import settings
+from chat.branches import MessageTree
+from chat.generation import GenerationRequest, HistoryItem, generate
+from chat.models import UIMessage
+from chat.rendering import render_markdown
+from chat.storage import store
 
 
-DEFAULT_CHATS: dict[str, list[UIMessage]] = {"Intros": []}
+DEFAULT_CHAT = "Intros"
 
 
 class State(rx.State):
     """The app state."""
 
-    chats: rx.Field[dict[str, list[UIMessage]]] = rx.field(DEFAULT_CHATS)
-    current_chat = "Intros"
+    # Message trees of the chats opened in this session, only kept on the backend.
+    _trees: dict[str, MessageTree] = {}  # noqa: RUF012
+    # Current branch of the current chat, the only messages sent to the client.
+    messages: list[UIMessage] = []  # noqa: RUF012
+    # "position/count" of the messages of the branch which have other versions.
+    versions: dict[str, str] = {}  # noqa: RUF012
+    # Question being edited: the next question becomes a new version of it.
+    editing: str = ""
+    current_chat = DEFAULT_CHAT
     processing: bool = False
     new_chat_name: str = ""
-    input_question: str = ""
 
-    def create_chat(self):
+    async def create_chat(self):
         """Create a new chat."""
-        self.current_chat = self.new_chat_name
-        self.chats[self.new_chat_name] = []
+        user = self.router.session.client_token
+        await asyncio.to_thread(store.add_chat, user, self.new_chat_name)
+        updated = await asyncio.to_thread(store.chat_updated, user, self.new_chat_name)
+        self._cache_chat(self.new_chat_name, MessageTree(updated=updated))
+        self._show(self.new_chat_name)
+
+    async def delete_chat(self, chat_name: str):
+        """Delete a chat.
+
+        Args:
+            chat_name: The name of the chat.
+        """
+        user = self.router.session.client_token
+        await asyncio.to_thread(store.delete_chat, user, chat_name)
+        self._trees.pop(chat_name, None)
+        if chat_name == self.current_chat:
+            recent = await asyncio.to_thread(store.recent_chats, user, limit=1)
+            await self._open_chat(recent[0].name if recent else DEFAULT_CHAT)
 
-    def delete_chat(self):
-        """Delete the current chat."""
-        del self.chats[self.current_chat]
-        if len(self.chats) == 0:
-            self.chats = DEFAULT_CHATS
-        self.current_chat = next(iter(self.chats.keys()))
+    async def hydrate(self):
+        """Load the current chat if the session does not hold it (or an old version)."""
+        await self._open_chat(self.current_chat)
 
     async def set_chat(self, chat_name: str):
         """Set the name of the current chat.
@@ -76,37 +65,166 @@ class State(rx.State):
         Args:
             chat_name: The name of the chat.
         """
-        self.current_chat = chat_name
+        await self._open_chat(chat_name)
 
-    @rx.event
-    def set_input_question(self, value: str | rfx.CardItem) -> None:
-        """Update the current input question.
+    async def prefetch_chat(self, chat_name: str):
+        """Load a chat in advance (e.g. on hover), so opening it is instant.
 
         Args:
-            value: The new input question value
+            chat_name: The name of the chat.
         """
-        match value:
-            case rfx.CardItem():
-                self.input_question = value.description
-            case dict():
-                self.input_question = value.get("description", "")
-            case _:
-                self.input_question = value
-
-    @rx.var(cache=True)
-    def chat_titles(self) -> list[str]:
-        """Get the list of chat titles.
+        await self._load_chat(chat_name)
+
+    async def open_message(self, chat_name: str, message_id: str):
+        """Open a chat on the (latest) branch containing a message.
+
+        The message may be older than the loaded messages, so its branch is loaded
+        from the message itself: a page above it and everything below it.
+
+        Args:
+            chat_name: The name of the chat.
+            message_id: The message.
+        """
+        await self._open_chat(chat_name)
+        tree = self._trees[chat_name]
+        user = self.router.session.client_token
+        if message_id not in tree.nodes:
+            above = await asyncio.to_thread(
+                store.load_branch, user, message_id, tree.nodes, settings.CHAT_PAGE_SIZE
+            )
+            await self._add_branch(chat_name, tree, above)
+        head = await asyncio.to_thread(store.latest_leaf, user, chat_name, message_id)
+        # The first message between the head and the message which is not loaded.
+        path = tree.path(head)
+        missing = path[0].parent_id if path else head
+        if missing and missing not in tree.nodes:
+            # Stops at the message (or another loaded one) at the latest.
+            between = await asyncio.to_thread(
+                store.load_branch, user, missing, tree.nodes
+            )
+            await self._add_branch(chat_name, tree, between)
+        await self._switch_to(chat_name, head)
+
+    def edit_message(self, message_id: str):
+        """Put an earlier question into the input, to ask a new version of it.
+
+        Args:
+            message_id: The question.
+        """
+        self.editing = message_id
+        question = self._trees[self.current_chat].nodes[message_id].content
+        return rx.set_value("question", question)
+
+    def cancel_edit(self):
+        """Ask the next question at the end of the branch again."""
+        self.editing = ""
+        return rx.set_value("question", "")
+
+    async def switch_version(self, message_id: str, step: int):
+        """Show another version of a message, with the latest branch below it.
+
+        Args:
+            message_id: The message whose version is shown now.
+            step: 1 for the next version, -1 for the previous one.
+        """
+        if self.processing:
+            return
+        tree = self._trees[self.current_chat]
+        siblings = tree.siblings(tree.nodes[message_id])
+        target = siblings[(siblings.index(message_id) + step) % len(siblings)]
+        user = self.router.session.client_token
+        head = await asyncio.to_thread(store.latest_leaf, user, self.current_chat, target)
+        await self._switch_to(self.current_chat, head)
+
+    async def _switch_to(self, chat_name: str, head: str):
+        tree = self._trees[chat_name]
+        if head not in tree.nodes:
+            # Only the part of the branch which is not loaded yet is read.
+            user = self.router.session.client_token
+            suffix = await asyncio.to_thread(
+                store.load_branch, user, head, tree.nodes, settings.CHAT_PAGE_SIZE
+            )
+            await self._add_branch(chat_name, tree, suffix)
+        tree.head = head
+        self.editing = ""
+        self._show(chat_name)
+
+    async def _add_branch(
+        self, chat_name: str, tree: MessageTree, messages: list[UIMessage]
+    ):
+        user = self.router.session.client_token
+        parents = [message.id for message in messages]
+        children = await asyncio.to_thread(store.children, user, chat_name, parents)
+        tree.children.update(children)
+        tree.add_branch(messages)
+
+    async def _load_chat(self, chat_name: str) -> MessageTree:
+        user = self.router.session.client_token
+        updated = await asyncio.to_thread(store.chat_updated, user, chat_name)
+        tree = self._trees.get(chat_name)
+        # Messages may have been added elsewhere (e.g. via the API) since loading,
+        # but a streaming answer must stay in its tree.
+        if tree is None or (tree.updated != updated and not self.processing):
+            messages = await asyncio.to_thread(
+                store.load_chat, user, chat_name, settings.CHAT_PAGE_SIZE
+            )
+            tree = MessageTree(updated=updated)
+            await self._add_branch(chat_name, tree, messages)
+            self._cache_chat(chat_name, tree)
+        return tree
+
+    async def _open_chat(self, chat_name: str):
+        # Added first, so the loaded chat carries the change time of the entry.
+        await asyncio.to_thread(
+            store.add_chat, self.router.session.client_token, chat_name
+        )
+        await self._load_chat(chat_name)
+        self._show(chat_name)
+
+    def evict(self) -> int:
+        """Drop the loaded messages, keeping the current chat name as stub.
 
         Returns:
-            The list of chat names.
+            Approximate size of the dropped messages in bytes.
         """
-        return list(self.chats.keys())
+        freed = sum(
+            len(message.model_dump_json())
+            for tree in self._trees.values()
+            for message in tree.nodes.values()
+        )
+        self._trees = {}
+        self.messages = []
+        self.versions = {}
+        return freed
+
+    async def rehydrate(self):
+        """Load the current chat again after an eviction."""
+        await self._open_chat(self.current_chat)
+
+    def _cache_chat(self, chat_name: str, tree: MessageTree):
+        self._trees[chat_name] = tree
+        # Forget the least recently loaded chats, except the current one.
+        for name in list(self._trees)[: -settings.CHAT_CACHE_SIZE]:
+            if name != self.current_chat:
+                del self._trees[name]
+
+    def _show(self, chat_name: str):
+        self.current_chat = chat_name
+        tree = self._trees[chat_name]
+        path = tree.path(tree.head)
+        versions = {}
+        for message in path:
+            if len(siblings := tree.siblings(message)) > 1:
+                position = siblings.index(message.id) + 1
+                versions[message.id] = f"{position}/{len(siblings)}"
+        self.messages = path
+        self.versions = versions
 
     def format_chat_history(self) -> list:
         """Format the chat history into pairs of [user_content, assistant_content]."""
         result = []
 
-        messages = self.chats[self.current_chat]
+        messages = self.messages
         for i in range(0, len(messages), 2):
             if i + 1 < len(messages):
                 # Regular case: we have both user and assistant messages
@@ -120,50 +238,160 @@ class State(rx.State):
 
         return result
 
+    @rx.event(background=True)
     async def process_question(self, form_data: dict[str, Any]):
         """Process a question from the form.
 
+        Runs as background task: the state lock is only held for short update
+        windows, so other events of the session are not queued behind the stream.
+
         Args:
             form_data: Form data containing the question.
         """
         question = form_data["question"]
         if question == "":
             return
-        self.input_question = ""
-        async for value in self.openai_process_question(question):
-            yield value
+        await self.openai_process_question(question)
+
+    @rx.event(background=True)
+    async def regenerate(self, message_id: str):
+        """Generate a new version of an answer.
+
+        Args:
+            message_id: The answer.
+        """
+        async with self:
+            if self.processing:
+                return
+            chat_name = self.current_chat
+            user = self.router.session.client_token
+            tree = self._trees[chat_name]
+            parent = tree.nodes[message_id].parent_id
+            if (question := tree.nodes.get(parent or "")) is None:
+                return
+            request, answer = self._start_answer(tree, question)
+        await self._stream_answer(user, chat_name, request, answer)
 
     async def openai_process_question(self, question: str):
         """Get the response from the API.
 
+        Stream deltas are collected and applied at most every
+        `STREAM_APPLY_INTERVAL` seconds.
+
         Args:
             question: The current question.
         """
-        from llmling_agent import ChatMessage
+        async with self:
+            # The user may switch chats while streaming, so remember the target.
+            chat_name = self.current_chat
+            user = self.router.session.client_token
+            tree = await self._load_chat(chat_name)
+            # An edited question forks off before the original one.
+            edited = tree.nodes.get(self.editing)
+            parent = edited.parent_id if edited else tree.head
+            self.editing = ""
+            user_message = UIMessage(
+                role="user",
+                content=question,
+                html=render_markdown(question),
+                parent_id=parent,
+            )
+            tree.add(user_message)
+            request, answer = self._start_answer(tree, user_message)
 
-        user_message = UIMessage(role="user", content=question)
-        self.chats[self.current_chat].append(user_message)
-        assistant_message = UIMessage(role="assistant", content="")
-        self.chats[self.current_chat].append(assistant_message)
+        await self._store_message(user, chat_name, user_message)
+        await self._stream_answer(user, chat_name, request, answer)
+
+    def _start_answer(
+        self, tree: MessageTree, question: UIMessage
+    ) -> tuple[GenerationRequest, UIMessage]:
+        """Add an empty answer below a question and build its request."""
+        # Exclude the question, it is passed as prompt.
+        history = [
+            HistoryItem(role=msg.role, content=msg.content)
+            for msg in tree.path(question.parent_id)
+        ]
+        request = GenerationRequest(
+            prompt=question.content,
+            history=history,
+            history_tokens=tree.tokens(question.parent_id),
+            user=self.router.session.client_token,
+        )
+        answer = UIMessage(role="assistant", content="", parent_id=question.id)
+        tree.add(answer)
+        self._show(self.current_chat)
         self.processing = True
-        yield
-        messages = []
-        for msg in self.chats[self.current_chat][:-1]:  # Exclude empty assistant message
-            chat_message = ChatMessage(content=msg.content, role=msg.role)
-            messages.append(chat_message)
-        agent = pool.get_agent("simple_agent")
-        async with agent.run_stream(question) as stream:
-            # Stream the results
-            async for chunk in stream.stream():
-                assistant_msg_idx = len(self.chats[self.current_chat]) - 1
-                self.chats[self.current_chat][assistant_msg_idx].content = chunk
-                yield
-        # Update with final result and metadata
-        if result := agent.conversation.chat_messages[-1]:
-            # Convert the full ChatMessage result to our UIMessage format
-            ui_message = UIMessage.from_chat_message(result)
-            # Update our assistant message with all the metadata
-            assistant_msg_idx = len(self.chats[self.current_chat]) - 1
-            self.chats[self.current_chat][assistant_msg_idx] = ui_message
-
-        self.processing = False
+        return request, answer
+
+    async def _stream_answer(
+        self, user: str, chat_name: str, request: GenerationRequest, answer: UIMessage
+    ):
+        text = ""
+        final: UIMessage | None = None
+        last_apply = time.monotonic()
+        try:
+            async for event in generate(request):
+                if event.message:
+                    # Keep the placeholder's id and position in the tree.
+                    final = event.message.model_copy(
+                        update={"id": answer.id, "parent_id": answer.parent_id}
+                    )
+                    break
+                if event.kind == "restart":
+                    text = ""
+                text += event.content
+                if time.monotonic() - last_apply >= settings.STREAM_APPLY_INTERVAL:
+                    async with self:
+                        self._update_message(chat_name, answer.id, text)
+                    last_apply = time.monotonic()
+        finally:
+            async with self:
+                if final:
+                    self._update_message(chat_name, answer.id, text, final)
+                else:
+                    # Not stored, so nothing may be added below the placeholder.
+                    self._remove_message(chat_name, answer.id)
+                self.processing = False
+        if final:
+            await self._store_message(user, chat_name, final)
+
+    async def _store_message(self, user: str, chat_name: str, message: UIMessage):
+        """Store a message of this session, which keeps its loaded chat.
+
+        The chat is only reloaded on its next opening if somebody else changed it.
+        """
+        async with self:
+            tree = self._trees.get(chat_name)
+            seen = tree.updated if tree else None
+        updated = await asyncio.to_thread(
+            store.add_message, user, chat_name, message, seen
+        )
+        async with self:
+            if tree is not None and tree.updated == seen:
+                tree.updated = updated
+
+    def _remove_message(self, chat_name: str, message_id: str):
+        """Remove a message, if its chat is still loaded."""
+        if (tree := self._trees.get(chat_name)) is None:
+            return
+        tree.remove(message_id)
+        if chat_name == self.current_chat:
+            self._show(chat_name)
+
+    def _update_message(
+        self,
+        chat_name: str,
+        message_id: str,
+        content: str,
+        final: UIMessage | None = None,
+    ):
+        """Update a message in place, if its chat is still loaded."""
+        if (tree := self._trees.get(chat_name)) is None:
+            return
+        if final:
+            tree.replace(final)
+        elif message := tree.nodes.get(message_id):
+            message.content = content
+        if chat_name == self.current_chat:
+            # Rebuilt, so the change is sent to the client.
+            self._show(chat_name)
@@ -0,0 +1,440 @@
+"""Durable message storage with a full-text search index."""
+
+from __future__ import annotations
+
+import html
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel
+
+from chat import settings
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from chat.models import UIMessage
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    chat TEXT NOT NULL,
+    id TEXT NOT NULL UNIQUE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created REAL NOT NULL,
+    parent TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_chat ON messages (user, chat, rowid);
+CREATE INDEX IF NOT EXISTS messages_parent ON messages (user, chat, parent);
+"""
+
+# Full-text index of the message contents with their user, so a search is
+# scoped to the user's messages inside the FTS query.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    user,
+    content='messages',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content, user)
+    VALUES (new.rowid, new.content, new.user);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, user)
+    VALUES ('delete', old.rowid, old.content, old.user);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF content, user ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, user)
+    VALUES ('delete', old.rowid, old.content, old.user);
+    INSERT INTO messages_fts (rowid, content, user)
+    VALUES (new.rowid, new.content, new.user);
+END;
+"""
+
+# Recency index of the chats of each user, kept up to date on new messages.
+CHATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    user TEXT NOT NULL,
+    chat TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (user, chat)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chats_recent ON chats (user, updated DESC, chat);
+CREATE TRIGGER IF NOT EXISTS chats_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO chats (user, chat, updated) VALUES (new.user, new.chat, new.created)
+    ON CONFLICT (user, chat) DO UPDATE SET updated = excluded.updated;
+END;
+CREATE TRIGGER IF NOT EXISTS chats_au AFTER UPDATE OF user, chat ON messages BEGIN
+    INSERT INTO chats (user, chat, updated) VALUES (new.user, new.chat, new.created)
+    ON CONFLICT (user, chat) DO UPDATE SET updated = max(updated, excluded.updated);
+END;
+"""
+
+# Walks from a message to the root of its branch, stopping before known
+# messages (JSON array) and after a maximum depth (negative: unlimited).
+BRANCH_QUERY = """
+WITH RECURSIVE branch (id, parent, data, depth) AS (
+    SELECT id, parent, data, 1 FROM messages
+    WHERE user = ?1 AND id = ?2 AND id NOT IN (SELECT value FROM json_each(?3))
+    UNION ALL
+    SELECT m.id, m.parent, m.data, b.depth + 1 FROM messages m
+    JOIN branch b ON m.id = b.parent
+    WHERE m.user = ?1 AND (?4 < 0 OR b.depth < ?4)
+    AND m.id NOT IN (SELECT value FROM json_each(?3))
+)
+SELECT data, parent FROM branch ORDER BY depth DESC
+"""
+
+# The most recently stored message below (or equal to) a message.
+LATEST_LEAF_QUERY = """
+WITH RECURSIVE below (id, position) AS (
+    SELECT id, rowid FROM messages WHERE user = ?1 AND chat = ?2 AND id = ?3
+    UNION ALL
+    SELECT m.id, m.rowid FROM messages m JOIN below b ON m.parent = b.id
+    WHERE m.user = ?1 AND m.chat = ?2
+)
+SELECT id FROM below ORDER BY position DESC LIMIT 1
+"""
+
+# Control characters used as snippet markers, replaced after HTML-escaping.
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+
+class SearchHit(BaseModel):
+    """A ranked search result."""
+
+    chat: str
+    message_id: str
+    role: str
+    snippet: str
+    """HTML-escaped excerpt with matches wrapped in <mark>."""
+
+
+class ChatEntry(BaseModel):
+    """A chat in the recency index."""
+
+    name: str
+    updated: float
+
+
+def _fts_query(text: str) -> str:
+    """Turn user input into a safe FTS5 query (all words, prefix match)."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+class ChatStore:
+    """SQLite store of finalized messages, indexed with FTS5.
+
+    Connections are per thread, so calls may be run via `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if (conn := getattr(self._local, "conn", None)) is None:
+            conn = self.connect()
+            self._local.conn = conn
+        return conn
+
+    def connect(self, **kwargs: Any) -> sqlite3.Connection:
+        """Open a new connection, for long-running reads outside of `db`."""
+        conn = sqlite3.connect(self.path, isolation_level=None, **kwargs)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        conn.executescript(FTS_SCHEMA)
+        conn.executescript(CHATS_SCHEMA)
+        return conn
+
+    def add_message(
+        self, user: str, chat: str, message: UIMessage, seen: float | None = None
+    ) -> float | None:
+        """Store (or replace) a finalized message and index its content.
+
+        Args:
+            user: The user (client token).
+            chat: The chat name.
+            message: The message.
+            seen: The change time of the chat the caller holds (`chat_updated`).
+
+        Returns:
+            The new change time of the chat, or `seen` if somebody else changed
+            the chat since, so the caller still notices that change.
+        """
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.chat_updated(user, chat)
+            self._insert([(user, chat, message)])
+            after = self.chat_updated(user, chat)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return after if before == seen else seen
+
+    def add_messages(self, rows: Iterable[tuple[str, str, UIMessage]]):
+        """Store (or replace) messages of (user, chat, message) in one transaction.
+
+        A message id stored for another user is left unchanged.
+        """
+        db = self.db
+        db.execute("BEGIN")
+        try:
+            self._insert(rows)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _insert(self, rows: Iterable[tuple[str, str, UIMessage]]):
+        now = time.time()
+        params = [
+            (
+                user,
+                chat,
+                message.id,
+                message.role,
+                message.content,
+                message.model_dump_json(),
+                now,
+                message.parent_id,
+            )
+            for user, chat, message in rows
+        ]
+        self.db.executemany(
+            "INSERT INTO messages"
+            " (user, chat, id, role, content, data, created, parent)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET chat = excluded.chat,"
+            " content = excluded.content, data = excluded.data,"
+            " parent = excluded.parent WHERE messages.user = excluded.user",
+            params,
+        )
+
+    def owners(self, message_ids: Iterable[str]) -> dict[str, str]:
+        """Get the user of each stored message of the given ids."""
+        rows = self.db.execute(
+            "SELECT id, user FROM messages WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(message_ids)),),
+        )
+        return dict(rows.fetchall())
+
+    def add_chat(self, user: str, chat: str):
+        """Add a chat to the recency index, if it is not there yet."""
+        self.db.execute(
+            "INSERT OR IGNORE INTO chats (user, chat, updated) VALUES (?, ?, ?)",
+            (user, chat, time.time()),
+        )
+
+    def chat_updated(self, user: str, chat: str) -> float | None:
+        """Get the time of the last change of a chat, None if it does not exist."""
+        row = self.db.execute(
+            "SELECT updated FROM chats WHERE user = ? AND chat = ?", (user, chat)
+        ).fetchone()
+        return row[0] if row else None
+
+    def recent_chats(
+        self,
+        user: str,
+        query: str = "",
+        before: ChatEntry | None = None,
+        limit: int = 50,
+    ) -> list[ChatEntry]:
+        """Get a page of the chats of a user, most recently updated first.
+
+        Args:
+            user: The user (client token).
+            query: Only list chats whose name contains this text.
+            before: Cursor, the last entry of the previous page.
+            limit: Page size.
+        """
+        sql = "SELECT chat, updated FROM chats WHERE user = ?"
+        params: list[Any] = [user]
+        if query:
+            escaped = re.sub(r"([\\%_])", r"\\\1", query)
+            sql += " AND chat LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+        if before is not None:
+            sql += " AND (updated, chat) < (?, ?)"
+            params.extend([before.updated, before.name])
+        sql += " ORDER BY updated DESC, chat DESC LIMIT ?"
+        rows = self.db.execute(sql, [*params, limit])
+        return [ChatEntry(name=chat, updated=updated) for chat, updated in rows]
+
+    def load_chat(
+        self, user: str, chat: str, limit: int | None = None
+    ) -> list[UIMessage]:
+        """Get the messages of the most recently extended branch of a chat, in order.
+
+        Args:
+            user: The user (client token).
+            chat: The chat name.
+            limit: Only get this many of the latest messages.
+        """
+        row = self.db.execute(
+            "SELECT id FROM messages WHERE user = ? AND chat = ?"
+            " ORDER BY rowid DESC LIMIT 1",
+            (user, chat),
+        ).fetchone()
+        return self.load_branch(user, row[0], limit=limit) if row else []
+
+    def load_branch(
+        self,
+        user: str,
+        head: str,
+        known: Iterable[str] = (),
+        limit: int | None = None,
+    ) -> list[UIMessage]:
+        """Get the messages of the branch ending with `head`, root first.
+
+        Args:
+            user: The user (client token).
+            head: Id of the last message of the branch.
+            known: Ids of messages the caller holds; loading stops at the first one,
+                so only the part of the branch diverging from them is read.
+            limit: Only get this many of the latest messages.
+        """
+        from chat.models import UIMessage
+
+        rows = self.db.execute(
+            BRANCH_QUERY,
+            (user, head, json.dumps(list(known)), -1 if limit is None else limit),
+        )
+        messages = []
+        for data, parent in rows:
+            message = UIMessage.model_validate_json(data)
+            # The column is authoritative, it is also set for migrated messages.
+            message.parent_id = parent
+            messages.append(message)
+        return messages
+
+    def latest_leaf(self, user: str, chat: str, message_id: str) -> str:
+        """Get the most recently stored message of the branches below a message."""
+        row = self.db.execute(LATEST_LEAF_QUERY, (user, chat, message_id)).fetchone()
+        return row[0] if row else message_id
+
+    def children(
+        self, user: str, chat: str, parents: Iterable[str]
+    ) -> dict[str, list[str]]:
+        """Get the ids of the child messages of the given messages, in order.
+
+        The first messages of the chat are listed under the key "".
+        """
+        rows = self.db.execute(
+            "SELECT coalesce(parent, ''), id FROM messages WHERE user = ? AND chat = ?"
+            " AND (parent IN (SELECT value FROM json_each(?)) OR parent IS NULL)"
+            " ORDER BY rowid",
+            (user, chat, json.dumps(list(parents))),
+        )
+        children: dict[str, list[str]] = {}
+        for parent, message_id in rows:
+            children.setdefault(parent, []).append(message_id)
+        return children
+
+    def list_chats(
+        self,
+        user: str | None = None,
+        after: tuple[str, str] | None = None,
+        limit: int = 100,
+    ) -> list[tuple[str, str]]:
+        """Get a page of (user, chat) pairs, ordered by user and chat name.
+
+        Args:
+            user: Only list chats of this user.
+            after: Cursor, the last (user, chat) pair of the previous page.
+            limit: Page size.
+        """
+        where, params = [], []
+        if user is not None:
+            where.append("user = ?")
+            params.append(user)
+        if after is not None:
+            where.append("(user, chat) > (?, ?)")
+            params.extend(after)
+        condition = f"WHERE {' AND '.join(where)}" if where else ""
+        rows = self.db.execute(
+            f"SELECT DISTINCT user, chat FROM messages {condition}"
+            " ORDER BY user, chat LIMIT ?",
+            [*params, limit],
+        )
+        return list(rows)
+
+    def iter_messages(
+        self, chats: list[tuple[str, str]]
+    ) -> Iterator[tuple[str, str, str]]:
+        """Stream (user, chat, message JSON) of the given chats with constant memory.
+
+        Uses its own connection, so the iterator may be advanced from any thread.
+        """
+        conn = self.connect(check_same_thread=False)
+        try:
+            for user, chat in chats:
+                cursor = conn.execute(
+                    "SELECT data FROM messages"
+                    " WHERE user = ? AND chat = ? ORDER BY rowid",
+                    (user, chat),
+                )
+                while batch := cursor.fetchmany(500):
+                    for (data,) in batch:
+                        yield user, chat, data
+        finally:
+            conn.close()
+
+    def delete_chat(self, user: str, chat: str):
+        """Remove a chat and all its messages."""
+        self.db.execute("DELETE FROM messages WHERE user = ? AND chat = ?", (user, chat))
+        self.db.execute("DELETE FROM chats WHERE user = ? AND chat = ?", (user, chat))
+
+    def search(
+        self, user: str, text: str, limit: int = 20, offset: int = 0
+    ) -> list[SearchHit]:
+        """Search the messages of a user, best matches first.
+
+        Args:
+            user: The user (client token) whose chats to search.
+            text: The search text.
+            limit: Page size.
+            offset: Number of hits to skip.
+        """
+        if not (query := _fts_query(text)):
+            return []
+        # Only the user's postings are matched; the join re-checks the exact user.
+        user_phrase = '"{}"'.format(user.replace('"', '""'))
+        rows = self.db.execute(
+            "SELECT m.chat, m.id, m.role,"
+            f" snippet(messages_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', 16)"
+            " FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid"
+            " WHERE messages_fts MATCH ? AND m.user = ?"
+            " ORDER BY bm25(messages_fts, 1.0, 0.0) LIMIT ? OFFSET ?",
+            (f"user : {user_phrase} AND content : ({query})", user, limit, offset),
+        )
+        return [
+            SearchHit(
+                chat=chat,
+                message_id=message_id,
+                role=role,
+                snippet=html.escape(snippet)
+                .replace(_MARK_START, "<mark>")
+                .replace(_MARK_END, "</mark>"),
+            )
+            for chat, message_id, role, snippet in rows
+        ]
+
+
+store = ChatStore(settings.STORE_PATH)
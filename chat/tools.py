@@ -1,17 +1,37 @@
 from __future__ import annotations
 
-import reflex as rx
+import asyncio
 
+from chat.documents import doc_name, get_index
+from chat.uploads import current_user, get_store
 
-def save_file(path: str, data: str):
+
+async def save_file(path: str, data: str) -> str:
     """Save a file to the upload directory.
 
+    The file is indexed for `search_documents` afterwards.
+
     Args:
         path: The filename of the file to create.
         data: The data to save.
     """
-    outfile = rx.get_upload_dir() / path
+    if (user := current_user.get()) is None:
+        return "Files can only be saved in a user's chat."
+    stored = await get_store().write_bytes(user, path, data.encode())
+    doc = doc_name(stored.user, stored.name)
+    await asyncio.to_thread(get_index().ingest, stored.path, doc)
+    return f"Saved {stored.name} ({stored.size} bytes)."
+
 
-    # Save the file.
-    with outfile.open("wt") as file_object:
-        file_object.write(data)
+def read_file(path: str, offset: int = 0, length: int = 20_000) -> str:
+    """Read (part of) an uploaded file.
+
+    Args:
+        path: The filename of the uploaded file.
+        offset: Byte offset to start reading at.
+        length: Maximum number of bytes to read.
+    """
+    if (user := current_user.get()) is None:
+        return "Files can only be read in a user's chat."
+    with get_store().open_mapped(user, path) as data:
+        return str(data[offset : offset + length], "utf-8", errors="replace")
@@ -0,0 +1,318 @@
+"""Streaming export and import of stored chats as (compressed) JSONL.
+
+Every line is one message: `{"user": ..., "chat": ..., "message": {...}}`.
+Both directions work chunk by chunk, so archives of any size pass through with
+constant memory. `zstd` needs Python 3.14 or the optional `backports.zstd`
+package (the `zstd` extra). Imported messages are rendered again, their stored
+HTML is never trusted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+from typing import TYPE_CHECKING, Literal, Protocol
+import zlib
+
+from pydantic import BaseModel, ValidationError
+
+from chat import settings
+from chat.models import UIMessage  # noqa: TC001
+from chat.rendering import render_markdown
+from chat.storage import store
+
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, AsyncIterator, Iterator
+
+
+# Validation errors listed in an import result.
+MAX_REPORTED_ERRORS = 10
+
+Compression = Literal["gzip", "zstd", "none"]
+
+MEDIA_TYPES: dict[Compression, str] = {
+    "gzip": "application/gzip",
+    "zstd": "application/zstd",
+    "none": "application/x-ndjson",
+}
+
+
+class TransferError(Exception):
+    """Raised for archives that can not be read or written."""
+
+
+class LineTooLongError(TransferError):
+    """Raised when an import line exceeds the configured maximum."""
+
+
+class ImportRecord(BaseModel):
+    user: str
+    chat: str
+    message: UIMessage
+
+
+class ImportResult(BaseModel):
+    imported: int = 0
+    invalid: int = 0
+    errors: list[str] = []
+    """The first few validation errors, with line numbers."""
+
+    def add_error(self, number: int, error: str):
+        """Count an invalid line and keep its error if there is room."""
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {number}: {error}")
+
+
+class _Codec(Protocol):
+    def compress(self, data: bytes, /) -> bytes: ...
+    def flush(self) -> bytes: ...
+
+
+class _Decoder(Protocol):
+    def decompress(self, data: bytes, /) -> Iterator[bytes]: ...
+
+
+class _Identity:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        yield data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _ZlibDecoder:
+    """Decompresses in steps of at most `TRANSFER_MAX_OUTPUT_BYTES`."""
+
+    def __init__(self):
+        # 47: detect zlib or gzip headers automatically.
+        self._obj = zlib.decompressobj(47)
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        limit = settings.TRANSFER_MAX_OUTPUT_BYTES
+        while True:
+            try:
+                out = self._obj.decompress(data, limit)
+            except zlib.error as e:
+                msg = f"Invalid archive: {e}"
+                raise TransferError(msg) from e
+            if out:
+                yield out
+            data = self._obj.unconsumed_tail
+            # A full step may leave output pending even without input.
+            if not data and len(out) < limit:
+                return
+
+
+class _ZstdDecoder:
+    """Decompresses in steps of at most `TRANSFER_MAX_OUTPUT_BYTES`, frame by frame."""
+
+    def __init__(self):
+        self._zstd = _zstd()
+        self._obj = self._zstd.ZstdDecompressor()
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        limit = settings.TRANSFER_MAX_OUTPUT_BYTES
+        while True:
+            try:
+                out = self._obj.decompress(data, limit)
+            except self._zstd.ZstdError as e:
+                msg = f"Invalid archive: {e}"
+                raise TransferError(msg) from e
+            if out:
+                yield out
+            if self._obj.eof:
+                # Concatenated frames continue in a new decompressor.
+                data = self._obj.unused_data
+                self._obj = self._zstd.ZstdDecompressor()
+                if not data:
+                    return
+            elif self._obj.needs_input:
+                return
+            else:
+                data = b""
+
+
+def _zstd():
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+    except ImportError:
+        try:
+            from backports import zstd  # type: ignore[import-not-found,no-redef]
+        except ImportError as e:
+            msg = "zstd needs Python 3.14 or the backports.zstd package"
+            raise TransferError(msg) from e
+    return zstd
+
+
+def _compressor(compression: Compression) -> _Codec:
+    match compression:
+        case "gzip":
+            return zlib.compressobj(6, zlib.DEFLATED, 31)
+        case "zstd":
+            return _zstd().ZstdCompressor()
+        case _:
+            return _Identity()
+
+
+def _decompressor(compression: Compression) -> _Decoder:
+    match compression:
+        case "gzip":
+            return _ZlibDecoder()
+        case "zstd":
+            return _ZstdDecoder()
+        case _:
+            return _Identity()
+
+
+def encode_cursor(user: str, chat: str) -> str:
+    """Encode the last exported chat as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps([user, chat]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Decode a cursor from `encode_cursor`.
+
+    Raises:
+        TransferError: If the cursor is malformed.
+    """
+    try:
+        user, chat = json.loads(base64.urlsafe_b64decode(cursor))
+    except ValueError as e:
+        msg = f"Invalid cursor: {cursor!r}"
+        raise TransferError(msg) from e
+    return str(user), str(chat)
+
+
+def export_page(
+    user: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> tuple[list[tuple[str, str]], str | None]:
+    """Get the chats of one export page.
+
+    Args:
+        user: Only export chats of this user.
+        cursor: Resume after the chat the cursor points to.
+        limit: Chats per page.
+
+    Returns:
+        The (user, chat) pairs and the cursor of the next page, if any.
+    """
+    limit = limit or settings.TRANSFER_PAGE_SIZE
+    after = decode_cursor(cursor) if cursor else None
+    chats = store.list_chats(user, after, limit + 1)
+    if len(chats) > limit:
+        chats = chats[:limit]
+        return chats, encode_cursor(*chats[-1])
+    return chats, None
+
+
+def iter_export(
+    chats: list[tuple[str, str]], compression: Compression = "gzip"
+) -> Iterator[bytes]:
+    """Stream the messages of chats as compressed JSONL.
+
+    The stored message JSON is written as is, without parsing it again.
+    """
+    compressor = _compressor(compression)
+    buffer = bytearray()
+    for user, chat, data in store.iter_messages(chats):
+        prefix = json.dumps({"user": user, "chat": chat})[:-1]
+        buffer += f'{prefix}, "message": {data}}}\n'.encode()
+        if len(buffer) >= settings.UPLOAD_CHUNK_SIZE:
+            if out := compressor.compress(bytes(buffer)):
+                yield out
+            buffer.clear()
+    tail = compressor.compress(bytes(buffer)) + compressor.flush()
+    if tail:
+        yield tail
+
+
+async def _iter_lines(
+    chunks: AsyncIterable[bytes], compression: Compression
+) -> AsyncIterator[bytes]:
+    decompressor = _decompressor(compression)
+    pending = b""
+    async for chunk in chunks:
+        for out in decompressor.decompress(chunk):
+            pending += out
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line
+            if len(pending) > settings.TRANSFER_MAX_LINE_BYTES:
+                msg = f"Line exceeds {settings.TRANSFER_MAX_LINE_BYTES} bytes"
+                raise LineTooLongError(msg)
+    if pending:
+        yield pending
+
+
+def _add_messages(rows: list[tuple[str, str, UIMessage]]):
+    for _user, _chat, message in rows:
+        # Shown as is (rx.html), so only HTML rendered here is stored.
+        message.html = render_markdown(message.content)
+    store.add_messages(rows)
+
+
+async def _store_batch(
+    batch: list[tuple[int, str, str, UIMessage]], result: ImportResult
+):
+    owners = await asyncio.to_thread(store.owners, [row[3].id for row in batch])
+    rows = []
+    for number, user, chat, message in batch:
+        if owners.get(message.id, user) != user:
+            result.add_error(number, "message id belongs to another user")
+        else:
+            rows.append((user, chat, message))
+    await asyncio.to_thread(_add_messages, rows)
+    result.imported += len(rows)
+
+
+async def import_stream(
+    chunks: AsyncIterable[bytes],
+    compression: Compression = "gzip",
+    user: str | None = None,
+) -> ImportResult:
+    """Validate and bulk-insert a (compressed) JSONL stream of messages.
+
+    Messages are inserted in batches, invalid lines are counted and skipped.
+    So are messages whose id is already stored for another user.
+
+    Args:
+        chunks: The archive content.
+        compression: The archive compression.
+        user: Import all chats for this user instead of the recorded ones.
+
+    Raises:
+        TransferError: If the archive can not be decompressed.
+    """
+    result = ImportResult()
+    batch: list[tuple[int, str, str, UIMessage]] = []
+    # Last message per chat, archives from before branching are linked in order.
+    previous: dict[tuple[str, str], str] = {}
+    number = 0
+    async for line in _iter_lines(chunks, compression):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            record = ImportRecord.model_validate_json(line)
+        except ValidationError as e:
+            result.add_error(number, e.errors()[0]["msg"])
+            continue
+        key = (user or record.user, record.chat)
+        if "parent_id" not in record.message.model_fields_set:
+            record.message.parent_id = previous.get(key)
+        previous[key] = record.message.id
+        batch.append((number, *key, record.message))
+        if len(batch) >= settings.TRANSFER_BATCH_SIZE:
+            await _store_batch(batch, result)
+            batch = []
+    if batch:
+        await _store_batch(batch, result)
+    return result
@@ -0,0 +1,78 @@
+"""Backend server transport: websocket compression for the event channel.
+
+Reflex state deltas of a streaming answer are JSON text and compress well, but
+most of them are only a few bytes. `ThresholdDeflate` negotiates
+permessage-deflate and sends messages below `CHAT_WS_DEFLATE_MIN_SIZE` as is,
+which the extension allows per message.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING, Any
+
+from uvicorn.protocols.websockets.wsproto_impl import WSProtocol
+from uvicorn.workers import UvicornH11Worker
+from wsproto.events import AcceptConnection
+from wsproto.extensions import PerMessageDeflate
+from wsproto.frame_protocol import Opcode
+
+from chat import settings
+
+
+if TYPE_CHECKING:
+    from wsproto.frame_protocol import FrameDecoder, FrameProtocol, RsvBits
+
+
+class ThresholdDeflate(PerMessageDeflate):
+    """permessage-deflate which skips compression of small messages."""
+
+    def __init__(self, min_size: int, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+        self._outbound_compressed = True
+
+    def frame_outbound(
+        self,
+        proto: FrameDecoder | FrameProtocol,
+        opcode: Opcode,
+        rsv: RsvBits,
+        data: bytes,
+        fin: bool,
+    ) -> tuple[RsvBits, bytes]:
+        if opcode in (Opcode.TEXT, Opcode.BINARY):
+            # Decided on the first frame, continuation frames follow it.
+            self._outbound_compressed = not fin or len(data) >= self.min_size
+        elif opcode is not Opcode.CONTINUATION:
+            # Control frames are never compressed.
+            return rsv, data
+        if not self._outbound_compressed:
+            return rsv, data
+        return super().frame_outbound(proto, opcode, rsv, data, fin)
+
+
+class CompressedWSProtocol(WSProtocol):
+    """uvicorn's wsproto protocol, negotiating `ThresholdDeflate`."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        send = self.conn.send
+
+        def send_with_threshold(event: Any) -> bytes:
+            if isinstance(event, AcceptConnection):
+                extensions = [
+                    ThresholdDeflate(settings.WS_DEFLATE_MIN_SIZE)
+                    if isinstance(extension, PerMessageDeflate)
+                    else extension
+                    for extension in event.extensions
+                ]
+                event = dataclasses.replace(event, extensions=extensions)
+            return send(event)
+
+        self.conn.send = send_with_threshold  # type: ignore[method-assign]
+
+
+class ChatWorker(UvicornH11Worker):
+    """Gunicorn worker using `CompressedWSProtocol` (see rxconfig.py)."""
+
+    CONFIG_KWARGS = {**UvicornH11Worker.CONFIG_KWARGS, "ws": CompressedWSProtocol}  # noqa: RUF012
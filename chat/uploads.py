@@ -0,0 +1,250 @@
+"""Streaming, content-addressed upload store.
+
+Files are stored once per content hash under `objects/`. The file names of each
+user and the stored objects are tracked in `uploads.db`, which all workers share:
+it counts the bytes against the quota and removes objects no name refers to
+anymore. Writes stream chunk by chunk into a temp file off the event loop and
+are published in one transaction.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+import threading
+from typing import TYPE_CHECKING, BinaryIO
+
+from pydantic import BaseModel
+
+from chat import settings
+
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, AsyncIterator, Iterator
+
+
+# User whose files the agent tools read and write, set per generation.
+current_user: ContextVar[str | None] = ContextVar("current_user", default=None)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (user, name)
+);
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest);
+"""
+
+
+class QuotaExceededError(Exception):
+    """Raised when an upload exceeds the file size or store quota."""
+
+
+class StoredFile(BaseModel):
+    user: str
+    name: str
+    digest: str
+    size: int
+    path: Path
+
+
+def _write_chunk(f: BinaryIO, hasher: hashlib._Hash, chunk: bytes):
+    # hashlib releases the GIL for larger buffers, so this runs well in a thread.
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+def _finish(f: BinaryIO):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+class UploadStore:
+    """Deduplicating file store in the upload directory."""
+
+    def __init__(self, root: Path, max_file_bytes: int, quota_bytes: int):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.quota_bytes = quota_bytes
+        self._local = threading.local()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if (conn := getattr(self._local, "conn", None)) is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.root / "uploads.db", isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @property
+    def used_bytes(self) -> int:
+        """Bytes used by all stored objects, of all workers."""
+        return self.db.execute("SELECT coalesce(sum(size), 0) FROM objects").fetchone()[0]
+
+    @staticmethod
+    def _component(value: str, what: str) -> str:
+        # Only keep the final path component to stay inside the store.
+        if not (safe := Path(value).name) or safe in {".", ".."}:
+            msg = f"Invalid {what}: {value!r}"
+            raise ValueError(msg)
+        return safe
+
+    def _check_quota(self, name: str, size: int, used: int):
+        if size > self.max_file_bytes:
+            msg = f"{name} exceeds the limit of {self.max_file_bytes} bytes"
+            raise QuotaExceededError(msg)
+        if used + size > self.quota_bytes:
+            msg = "Upload store quota exceeded"
+            raise QuotaExceededError(msg)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    async def write(
+        self, user: str, name: str, chunks: AsyncIterable[bytes]
+    ) -> StoredFile:
+        """Stream a file into the store.
+
+        Args:
+            user: The user owning the file.
+            name: The file name to store the content under.
+            chunks: The file content.
+
+        Raises:
+            QuotaExceededError: If the file is too large or the store is full.
+        """
+        user = self._component(user, "user")
+        name = self._component(name, "file name")
+        for directory in ("tmp", "objects"):
+            (self.root / directory).mkdir(parents=True, exist_ok=True)
+        used = await asyncio.to_thread(lambda: self.used_bytes)
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.root / "tmp")
+        tmp = Path(tmp_name)
+        f = os.fdopen(fd, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                self._check_quota(name, size, used)
+                await asyncio.to_thread(_write_chunk, f, hasher, chunk)
+            await asyncio.to_thread(_finish, f)
+            digest = hasher.hexdigest()
+            await asyncio.to_thread(self._publish, user, name, tmp, digest, size)
+        except BaseException:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            raise
+        target = self._object_path(digest)
+        return StoredFile(user=user, name=name, digest=digest, size=size, path=target)
+
+    def _publish(self, user: str, name: str, tmp: Path, digest: str, size: int):
+        """Move a written file into the store and point the name at it.
+
+        Runs in one write transaction, which serializes all workers, so the quota
+        check and the collection of the replaced object see every other upload.
+        """
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            target = self._object_path(digest)
+            stored = "SELECT 1 FROM objects WHERE digest = ?"
+            if db.execute(stored, (digest,)).fetchone() and target.exists():
+                # Same content is already stored.
+                tmp.unlink()
+            else:
+                used = db.execute(
+                    "SELECT coalesce(sum(size), 0) FROM objects"
+                ).fetchone()[0]
+                self._check_quota(name, size, used)
+                target.parent.mkdir(exist_ok=True)
+                tmp.replace(target)
+                db.execute(
+                    "INSERT OR REPLACE INTO objects (digest, size) VALUES (?, ?)",
+                    (digest, size),
+                )
+            old = db.execute(
+                "SELECT digest FROM files WHERE user = ? AND name = ?", (user, name)
+            ).fetchone()
+            db.execute(
+                "INSERT INTO files (user, name, digest) VALUES (?, ?, ?)"
+                " ON CONFLICT (user, name) DO UPDATE SET digest = excluded.digest",
+                (user, name, digest),
+            )
+            if old and old[0] != digest:
+                self._collect(db, old[0])
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _collect(self, db: sqlite3.Connection, digest: str):
+        """Remove an object if no file name refers to it anymore."""
+        if db.execute("SELECT 1 FROM files WHERE digest = ?", (digest,)).fetchone():
+            return
+        db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        # Readers which already opened the object keep their handle.
+        self._object_path(digest).unlink(missing_ok=True)
+
+    async def write_bytes(self, user: str, name: str, data: bytes) -> StoredFile:
+        """Store in-memory data, written in chunks like any other upload."""
+
+        async def chunks() -> AsyncIterator[bytes]:
+            view = memoryview(data)
+            for start in range(0, len(view), settings.UPLOAD_CHUNK_SIZE):
+                yield bytes(view[start : start + settings.UPLOAD_CHUNK_SIZE])
+
+        return await self.write(user, name, chunks())
+
+    def resolve(self, user: str, name: str) -> Path:
+        """Get the object path of a stored file.
+
+        Raises:
+            FileNotFoundError: If the user has no file with that name.
+        """
+        row = self.db.execute(
+            "SELECT digest FROM files WHERE user = ? AND name = ?",
+            (user, Path(name).name),
+        ).fetchone()
+        if row is None:
+            raise FileNotFoundError(name)
+        return self._object_path(row[0])
+
+    @contextmanager
+    def open_mapped(self, user: str, name: str) -> Iterator[memoryview]:
+        """Memory-map a stored file for reading without copying it into memory."""
+        with self.resolve(user, name).open("rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+
+@functools.cache
+def get_store() -> UploadStore:
+    import reflex as rx
+
+    return UploadStore(
+        rx.get_upload_dir(),
+        max_file_bytes=settings.UPLOAD_MAX_FILE_BYTES,
+        quota_bytes=settings.UPLOAD_QUOTA_BYTES,
+    )
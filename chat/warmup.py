@@ -0,0 +1,173 @@
+"""Agent warm-pool and connection pre-warming."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import itertools
+import logging
+from typing import TYPE_CHECKING, Any
+
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from llmling_agent import Agent, AgentPool
+
+
+logger = logging.getLogger(__name__)
+
+# Cheap endpoints per pydantic-ai provider prefix, used to open and keep alive
+# pooled connections before the first user request.
+PROVIDER_ENDPOINTS: dict[str, str] = {
+    "openai": "https://api.openai.com/v1/models",
+    "anthropic": "https://api.anthropic.com/v1/models",
+    "groq": "https://api.groq.com/openai/v1/models",
+    "mistral": "https://api.mistral.ai/v1/models",
+    "google-gla": "https://generativelanguage.googleapis.com/v1beta/models",
+}
+
+
+def _provider_prefix(agent_config: Any) -> str | None:
+    """Get the provider prefix ("openai", ...) of an agent config."""
+    provider = getattr(agent_config, "provider", None)
+    model = getattr(provider, "model", None) or getattr(agent_config, "model", None)
+    if isinstance(model, str) and ":" in model:
+        return model.split(":", 1)[0]
+    return None
+
+
+class AgentWarmPool:
+    """Pre-instantiated agent copies which are handed out per run.
+
+    Each copy is created via `AgentPool.clone_agent`, so provider clients and tools
+    are set up once at startup instead of on the first request of a user.
+    """
+
+    def __init__(
+        self,
+        pool: AgentPool[Any],
+        instances: int = 1,
+        max_instances: int = 8,
+        ping_interval: float = 30,
+    ):
+        self.pool = pool
+        self.instances = instances
+        self.max_instances = max(max_instances, instances)
+        self.ping_interval = ping_interval
+        self.ready = False
+        # Set when the warm-up failed, agents are then only created on demand.
+        self.degraded = False
+        # Only the agents from agents.yml are pooled (copies register in the pool
+        # manifest too, so it is read once here).
+        self._idle: dict[str, asyncio.Queue[Agent[Any]]] = {
+            name: asyncio.Queue() for name in pool.manifest.agents
+        }
+        self._spawned: dict[str, int] = dict.fromkeys(self._idle, 0)
+        self._counter = itertools.count()
+        self._providers: set[str] = set()
+        self._use_jira = False
+        self._pinger: asyncio.Task[None] | None = None
+
+    async def warm_up(self):
+        """Create the agent copies, open connections and start the keep-alive loop."""
+        configs = {name: self.pool.manifest.agents[name] for name in self._idle}
+        for name, config in configs.items():
+            while self._spawned[name] < self.instances:
+                self._idle[name].put_nowait(await self._spawn(name))
+            if prefix := _provider_prefix(config):
+                self._providers.add(prefix)
+            self._use_jira |= any("jira" in str(tool) for tool in config.tools)
+        await self._ping()
+        self._pinger = asyncio.create_task(self._keep_alive())
+        self.ready = True
+        logger.info("Warm-up done for agents: %s", ", ".join(configs))
+
+    async def close(self):
+        """Stop the keep-alive loop."""
+        self.ready = False
+        if self._pinger:
+            self._pinger.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._pinger
+            self._pinger = None
+
+    @asynccontextmanager
+    async def acquire(self, name: str) -> AsyncIterator[Agent[Any]]:
+        """Borrow an idle copy of the given agent for a single run.
+
+        Falls back to creating a new copy when all warm ones are busy, up to
+        `max_instances` copies; beyond that, waits for one to be returned. The
+        copy's history is cleared before it goes back to the pool.
+
+        Args:
+            name: Name of the agent in agents.yml.
+
+        Raises:
+            KeyError: If the agent is not configured.
+        """
+        if (queue := self._idle.get(name)) is None:
+            msg = f"Agent {name} not found"
+            raise KeyError(msg)
+        try:
+            agent = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._spawned[name] < self.max_instances:
+                agent = await self._spawn(name)
+            else:
+                agent = await queue.get()
+        try:
+            yield agent
+        finally:
+            agent.conversation.clear()
+            queue.put_nowait(agent)
+
+    async def _spawn(self, name: str) -> Agent[Any]:
+        # Counted up front, so concurrent fallbacks cannot exceed the limit.
+        self._spawned[name] += 1
+        try:
+            agent = await self.pool.clone_agent(
+                name, f"{name}_warm_{next(self._counter)}"
+            )
+        except BaseException:
+            self._spawned[name] -= 1
+            raise
+        # The system prompt would name the copy; keep it identical across copies so
+        # it stays a cacheable prompt prefix at the provider.
+        agent.sys_prompts.inject_agent_info = False
+        # Resolve tool callables so their imports happen now.
+        await agent.tools.get_tools()
+        return agent
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self._ping()
+
+    async def _ping(self):
+        """Touch every configured endpoint so pooled connections stay open."""
+        import httpx
+        from pydantic_ai.models import cached_async_http_client
+
+        for provider in self._providers:
+            if not (url := PROVIDER_ENDPOINTS.get(provider)):
+                continue
+            # All cached pydantic-ai clients share one transport / connection pool.
+            client = cached_async_http_client(provider=provider)
+            try:
+                await client.head(url)
+            except httpx.HTTPError as e:
+                logger.debug("Warm-up ping to %s failed: %s", url, e)
+        if self._use_jira:
+            await asyncio.to_thread(self._ping_jira)
+
+    @staticmethod
+    def _ping_jira():
+        from llmling_agent_tools.jira_tool import jira_tools
+
+        if not jira_tools.JIRA_TOKEN:
+            return
+        try:
+            jira_tools.get_client().server_info()
+        except Exception as e:  # noqa: BLE001
+            logger.debug("Jira warm-up ping failed: %s", e)
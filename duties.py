@@ -24,6 +24,20 @@ def test(ctx, *args: str):
     ctx.run(f"uv run pytest{args_str}")
 
 
+@duty(capture=False)
+def batch(ctx, *args: str):
+    """Run prompts from a JSONL file through the agents (see chat/batch.py)."""
+    args_str = " " + " ".join(args) if args else ""
+    ctx.run(f"uv run python -m chat.batch{args_str}")
+
+
+@duty(capture=False)
+def train_router(ctx, *args: str):
+    """Train the prompt classifier of the model router (see chat/routing.py)."""
+    args_str = " " + " ".join(args) if args else ""
+    ctx.run(f"uv run python -m chat.routing train{args_str}")
+
+
 @duty(capture=False)
 def clean(ctx):
     """Clean all files from the Git directory except checked-in files."""
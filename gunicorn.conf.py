@@ -0,0 +1,10 @@
+"""Gunicorn settings, picked up by `reflex run --env prod --backend-only`."""
+
+from __future__ import annotations
+
+import os
+
+
+# Backend worker processes per node. Every worker serves websockets and takes
+# generations from the shared Redis queue (see chat/generation.py).
+workers = int(os.getenv("CHAT_BACKEND_WORKERS", "1"))
@@ -1,4 +1,8 @@
 import reflex as rx
 
 
-config = rx.Config(app_name="chat")
+config = rx.Config(
+    app_name="chat",
+    # Compresses larger websocket messages of the event channel (chat/transport.py).
+    gunicorn_worker_class="chat.transport.ChatWorker",
+)
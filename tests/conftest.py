@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import uuid
+
+import pytest
+import reflex.state  # noqa: F401  # before sqlmodel (imported by the agents)
+
+
+# Before `chat.storage` creates the store.
+os.environ.setdefault(
+    "CHAT_STORE_PATH",
+    os.path.join(tempfile.mkdtemp(), "chat.db"),  # noqa: PTH118
+)
+
+
+@pytest.fixture
+def state(monkeypatch):
+    """A chat `State` of a new session, outside of an app.
+
+    Background events may lock it (`async with self`), generations answer with
+    "answer to <prompt>".
+    """
+    from reflex.state import RouterData, State as RootState
+
+    from chat import state as state_module
+    from chat.generation import GenerationEvent
+    from chat.models import UIMessage
+    from chat.state import State
+
+    async def lock(self):
+        return self
+
+    async def unlock(self, *exc_info):
+        pass
+
+    async def generate(request):
+        content = f"answer to {request.prompt}"
+        yield GenerationEvent(kind="delta", content=content)
+        message = UIMessage(role="assistant", content=content)
+        yield GenerationEvent(kind="done", content=content, message=message)
+
+    monkeypatch.setattr(State, "__aenter__", lock)
+    monkeypatch.setattr(State, "__aexit__", unlock)
+    monkeypatch.setattr(state_module, "generate", generate)
+
+    root = RootState(_reflex_internal_init=True)
+    chat_state = root.get_substate(State.get_full_name().split(".")[1:])
+    chat_state.router = RouterData({"token": uuid.uuid4().hex})
+    return chat_state
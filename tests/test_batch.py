@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from chat.batch import read_requests
+
+
+def test_read_requests_skips_invalid_lines(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    lines = [
+        '{"prompt": "first"}',
+        "[1, 2]",
+        '"just a string"',
+        "not json",
+        '{"agent": "no prompt"}',
+        "",
+        '{"prompt": "done", "id": "d"}',
+        '{"prompt": "last", "id": "x"}',
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    requests = list(read_requests(path, done={"d"}))
+    assert [(r.id, r.prompt) for r in requests] == [
+        ("line-1", "first"),
+        ("x", "last"),
+    ]
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from chat.branches import CHARS_PER_TOKEN, ROOT, MessageTree
+from chat.models import UIMessage
+
+
+def _chain(tree: MessageTree, *contents: str) -> list[UIMessage]:
+    messages = []
+    for i, content in enumerate(contents):
+        role = "user" if i % 2 == 0 else "assistant"
+        parent = messages[-1].id if messages else tree.head
+        messages.append(UIMessage(role=role, content=content, parent_id=parent))
+        tree.add(messages[-1])
+    return messages
+
+
+def test_path_of_first_message_is_empty():
+    tree = MessageTree()
+    q1, a1, _q2, _a2 = _chain(tree, "q1", "a1", "q2", "a2")
+    assert tree.path(q1.parent_id) == []
+    assert tree.tokens(q1.parent_id) == 0
+    assert [m.content for m in tree.path(a1.parent_id)] == ["q1"]
+
+
+def test_path_of_head():
+    tree = MessageTree()
+    messages = _chain(tree, "q1", "a1", "q2")
+    assert tree.path(tree.head) == messages
+    assert MessageTree().path(None) == []
+
+
+def test_branch_tokens():
+    tree = MessageTree()
+    q1, a1 = _chain(tree, "x" * 40, "y" * 8)
+    assert q1.branch_tokens == 40 // CHARS_PER_TOKEN
+    assert a1.branch_tokens == (40 + 8) // CHARS_PER_TOKEN
+    assert tree.tokens(a1.id) == a1.branch_tokens
+
+
+def test_sibling_versions_share_prefix():
+    tree = MessageTree()
+    q1, a1 = _chain(tree, "q1", "a1")
+    tree.head = q1.id
+    a1b = _chain(tree, "a1b")[0]
+    assert tree.siblings(a1) == [a1.id, a1b.id]
+    assert [m.content for m in tree.path(a1b.id)] == ["q1", "a1b"]
+    assert [m.content for m in tree.path(a1.id)] == ["q1", "a1"]
+
+
+def test_remove_resets_head_to_parent():
+    tree = MessageTree()
+    q1, a1 = _chain(tree, "q1", "a1")
+    tree.remove(a1.id)
+    assert tree.head == q1.id
+    assert a1.id not in tree.nodes
+    assert tree.children[q1.id] == []
+    tree.remove(q1.id)
+    assert tree.head is None
+    assert tree.children[ROOT] == []
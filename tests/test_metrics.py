@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+import os
+
+from chat import metrics
+
+
+def test_render_labels_samples_with_the_worker():
+    metrics.inc("chat_generations_total", model="m")
+    pid = os.getpid()
+    assert f'chat_generations_total{{model="m",worker="{pid}"}} 1' in metrics.render()
+
+
+def test_shared_gauges_have_no_worker_label():
+    metrics.set_shared_gauge("chat_sessions_live", 3)
+    assert "chat_sessions_live{} 3\n" in metrics.render()
+    metrics.set_gauge("chat_sessions_live", 2)
+    assert f'chat_sessions_live{{worker="{os.getpid()}"}} 2' in metrics.render()
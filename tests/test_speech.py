@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import base64
+import uuid
+
+import numpy as np
+import pytest
+
+from chat import settings, speech
+from chat.speech import AudioFormat, FakeEngine
+
+
+MONO = AudioFormat(channels=1, sample_width=2, frame_rate=16_000)
+
+
+def _tone(seconds: float, level: float = 0.5) -> bytes:
+    t = np.arange(int(MONO.frame_rate * seconds)) / MONO.frame_rate
+    return (np.sin(2 * np.pi * 440 * t) * level * 32767).astype(np.int16).tobytes()
+
+
+def _silence(seconds: float) -> bytes:
+    return bytes(int(MONO.frame_rate * seconds) * 2)
+
+
+def _chunk(frames: bytes) -> str:
+    wav = speech.write_wav(MONO, frames)
+    return "data:audio/wav;base64," + base64.b64encode(wav).decode()
+
+
+def test_wav_round_trip():
+    frames = _tone(0.5)
+    audio_format, read = speech.read_wav(speech.write_wav(MONO, frames))
+    assert audio_format == MONO
+    assert read == frames
+    assert speech.duration(MONO, frames) == 0.5
+
+
+def test_ends_in_pause():
+    assert speech.ends_in_pause(MONO, _tone(1) + _silence(0.5))
+    assert not speech.ends_in_pause(MONO, _silence(0.5) + _tone(1))
+    assert not speech.ends_in_pause(MONO, b"")
+
+
+def test_fake_engine_says_a_word_per_second():
+    wav = speech.write_wav(MONO, _tone(3))
+    assert FakeEngine().transcribe(wav, "audio/wav") == "word word word"
+
+
+async def test_transcribe_in_worker_pool(monkeypatch):
+    monkeypatch.setattr(settings, "STT_ENGINE", "chat.speech.FakeEngine")
+    monkeypatch.setattr(settings, "STT_WORKERS", 1)
+    monkeypatch.setattr(speech, "_available", None)
+    speech.shutdown()
+    try:
+        assert await speech.available()
+        assert await speech.transcribe(speech.write_wav(MONO, _tone(2))) == "word word"
+    finally:
+        speech.shutdown()
+
+
+async def test_unloadable_engine_is_unavailable(monkeypatch):
+    monkeypatch.setattr(settings, "STT_ENGINE", "chat.speech.MissingEngine")
+    monkeypatch.setattr(settings, "STT_WORKERS", 1)
+    monkeypatch.setattr(speech, "_available", None)
+    speech.shutdown()
+    try:
+        assert not await speech.available()
+        with pytest.raises(speech.SpeechUnavailableError):
+            await speech.transcribe(b"")
+    finally:
+        speech.shutdown()
+
+
+@pytest.fixture
+def voice(monkeypatch):
+    """A `VoiceState` of a new session, transcribing with the fake engine."""
+    from reflex.state import RouterData, State as RootState
+
+    from chat.components.voice import VoiceState
+
+    async def lock(self):
+        return self
+
+    async def unlock(self, *exc_info):
+        pass
+
+    async def transcribe(audio, mime_type="audio/wav"):
+        return FakeEngine().transcribe(audio, mime_type)
+
+    monkeypatch.setattr(VoiceState, "__aenter__", lock)
+    monkeypatch.setattr(VoiceState, "__aexit__", unlock)
+    monkeypatch.setattr(speech, "transcribe", transcribe)
+
+    root = RootState(_reflex_internal_init=True)
+    voice_state = root.get_substate(VoiceState.get_full_name().split(".")[1:])
+    voice_state.router = RouterData({"token": uuid.uuid4().hex})
+    return voice_state
+
+
+async def _transcribe(voice) -> list:
+    return [event async for event in type(voice).transcribe_phrase.fn(voice)]
+
+
+async def test_audio_is_kept_out_of_the_state(voice):
+    from chat.components import voice as voice_module
+
+    voice.start()
+    assert voice.add_chunk(_chunk(_tone(2))) is not None
+    assert voice.add_chunk(_chunk(_tone(1))) is None  # already transcribing
+    token = voice.router.session.client_token
+    assert len(voice_module._audio[token][1]) == len(_tone(3))
+    assert not any(isinstance(value, bytes) for value in voice.dict().values())
+
+    await _transcribe(voice)
+    assert voice.transcript == "word word word"
+    assert not voice._busy
+
+
+async def test_phrase_ends_at_a_pause(voice):
+    from chat.components import voice as voice_module
+
+    voice.start()
+    voice.add_chunk(_chunk(_tone(2) + _silence(1)))
+    await _transcribe(voice)
+    token = voice.router.session.client_token
+    # Only audio after the pause is transcribed again.
+    assert not voice_module._audio[token][1]
+
+    voice.add_chunk(_chunk(_tone(1)))
+    await _transcribe(voice)
+    assert voice.transcript == "word word word word"
+
+    events = voice.submit()
+    assert events is not None
+    assert voice.transcript == ""
+    assert token not in voice_module._audio
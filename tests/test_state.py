@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from chat.branches import MessageTree
+from chat.models import UIMessage
+
+
+def _exchange(tree: MessageTree, question: str, answer: str) -> tuple[UIMessage, ...]:
+    q = UIMessage(role="user", content=question, parent_id=tree.head)
+    tree.add(q)
+    a = UIMessage(role="assistant", content=answer, parent_id=q.id)
+    tree.add(a)
+    return q, a
+
+
+def test_regenerating_first_answer_sends_no_history(state):
+    tree = MessageTree()
+    state._trees = {state.current_chat: tree}
+    q1, _a1 = _exchange(tree, "q1", "a1")
+    _exchange(tree, "q2", "a2")
+    request, answer = state._start_answer(tree, q1)
+    assert request.prompt == "q1"
+    assert request.history == []
+    assert request.history_tokens == 0
+    assert answer.parent_id == q1.id
+
+
+def test_history_is_the_branch_above_the_question(state):
+    tree = MessageTree()
+    state._trees = {state.current_chat: tree}
+    _exchange(tree, "q1", "a1")
+    q2, _a2 = _exchange(tree, "q2", "a2")
+    request, _answer = state._start_answer(tree, q2)
+    assert [item.content for item in request.history] == ["q1", "a1"]
+
+
+async def test_question_continues_the_chosen_version(state):
+    await state.set_chat("versions")
+    await state.openai_process_question("q1")
+    q1, _a1 = state.messages
+    state.edit_message(q1.id)
+    await state.openai_process_question("q1b")
+    assert [m.content for m in state.messages] == ["q1b", "answer to q1b"]
+
+    # Back to the first version, which is not the latest stored branch.
+    await state.switch_version(state.messages[0].id, -1)
+    await state.hydrate()
+    await state.openai_process_question("q2")
+    assert [m.content for m in state.messages] == [
+        "q1",
+        "answer to q1",
+        "q2",
+        "answer to q2",
+    ]
+    assert state.messages[2].parent_id == state.messages[1].id
+
+
+async def test_changes_from_elsewhere_are_loaded(state):
+    from chat.storage import store
+
+    await state.set_chat("shared")
+    await state.openai_process_question("q1")
+    answer = state.messages[-1]
+    user = state.router.session.client_token
+    question = UIMessage(role="user", content="via api", parent_id=answer.id)
+    store.add_message(user, "shared", question)
+    await state.hydrate()
+    assert state.messages[-1].content == "via api"
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import uuid
+
+import pytest
+
+from chat import settings, transfer
+from chat.models import UIMessage
+from chat.storage import store
+from chat.transfer import (
+    LineTooLongError,
+    TransferError,
+    import_stream,
+    iter_export,
+)
+
+
+async def _chunks(data: bytes, size: int = 1000):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def _line(user: str, chat: str, message: UIMessage) -> bytes:
+    record = {"user": user, "chat": chat, "message": message.model_dump(mode="json")}
+    return json.dumps(record).encode() + b"\n"
+
+
+def _compress(data: bytes, compression: transfer.Compression) -> bytes:
+    codec = transfer._compressor(compression)
+    return codec.compress(data) + codec.flush()
+
+
+def _zstd_available() -> bool:
+    try:
+        transfer._zstd()
+    except TransferError:
+        return False
+    return True
+
+
+COMPRESSIONS = [
+    "none",
+    "gzip",
+    pytest.param(
+        "zstd",
+        marks=pytest.mark.skipif(not _zstd_available(), reason="no zstd module"),
+    ),
+]
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+async def test_export_import_round_trip(compression):
+    source, target = uuid.uuid4().hex, uuid.uuid4().hex
+    question = UIMessage(role="user", content="hello *world*")
+    answer = UIMessage(role="assistant", content="hi", parent_id=question.id)
+    store.add_messages([(source, "c", question), (source, "c", answer)])
+
+    archive = b"".join(iter_export([(source, "c")], compression))
+    # Ids are unique across users, so the copy needs new ones.
+    text = (
+        _decompress(archive, compression)
+        .replace(question.id.encode(), f"{target}-q".encode())
+        .replace(answer.id.encode(), f"{target}-a".encode())
+    )
+    result = await import_stream(
+        _chunks(_compress(text, compression)), compression, target
+    )
+
+    assert result.imported == 2
+    assert result.invalid == 0
+    assert [m.content for m in store.load_chat(target, "c")] == ["hello *world*", "hi"]
+
+
+def _decompress(data: bytes, compression: transfer.Compression) -> bytes:
+    return b"".join(transfer._decompressor(compression).decompress(data))
+
+
+async def test_import_renders_html_again():
+    user = uuid.uuid4().hex
+    message = UIMessage(
+        role="assistant", content="**bold**", html="<img src=x onerror=alert(1)>"
+    )
+    result = await import_stream(_chunks(_line(user, "c", message)), "none")
+    assert result.imported == 1
+    stored = store.load_chat(user, "c")[0]
+    assert stored.html == "<p><strong>bold</strong></p>\n"
+
+
+async def test_import_reports_invalid_lines():
+    user = uuid.uuid4().hex
+    valid = _line(user, "c", UIMessage(role="user", content="ok"))
+    data = b'{"user": "x"}\n[1, 2]\nnot json\n\n' + valid
+    result = await import_stream(_chunks(data), "none")
+    assert result.imported == 1
+    assert result.invalid == 3
+    assert [error.split(":")[0] for error in result.errors] == [
+        "line 1",
+        "line 2",
+        "line 3",
+    ]
+
+
+async def test_import_keeps_ids_of_other_users():
+    owner, other = uuid.uuid4().hex, uuid.uuid4().hex
+    message = UIMessage(role="user", content="mine")
+    store.add_message(owner, "c", message)
+    forged = message.model_copy(update={"content": "forged"})
+    result = await import_stream(_chunks(_line(other, "c", forged)), "none")
+    assert result.imported == 0
+    assert result.errors == ["line 1: message id belongs to another user"]
+    assert store.load_chat(owner, "c")[0].content == "mine"
+
+
+async def test_import_rejects_long_lines(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSFER_MAX_LINE_BYTES", 100)
+    with pytest.raises(LineTooLongError):
+        await import_stream(_chunks(b"x" * 1000), "none")
+
+
+async def test_import_rejects_invalid_archives():
+    with pytest.raises(TransferError):
+        await import_stream(_chunks(b"not gzip at all"), "gzip")
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS[1:])
+def test_decompression_output_is_bounded(monkeypatch, compression):
+    monkeypatch.setattr(settings, "TRANSFER_MAX_OUTPUT_BYTES", 64 * 1024)
+    bomb = _compress(b"\0" * (16 * 1024**2), compression)
+    decoder = transfer._decompressor(compression)
+    sizes = [len(out) for out in decoder.decompress(bomb)]
+    assert max(sizes) <= 64 * 1024
+    assert sum(sizes) == 16 * 1024**2
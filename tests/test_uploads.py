@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+
+from chat.uploads import QuotaExceededError, UploadStore
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return UploadStore(tmp_path, max_file_bytes=100, quota_bytes=150)
+
+
+async def test_files_are_per_user_and_deduplicated(uploads):
+    first = await uploads.write_bytes("alice", "a.txt", b"same")
+    second = await uploads.write_bytes("bob", "a.txt", b"same")
+    assert first.path == second.path
+    assert uploads.used_bytes == 4
+    assert uploads.resolve("alice", "a.txt").read_bytes() == b"same"
+    with pytest.raises(FileNotFoundError):
+        uploads.resolve("carol", "a.txt")
+
+
+async def test_replaced_objects_are_collected(uploads):
+    old = await uploads.write_bytes("alice", "a.txt", b"old")
+    await uploads.write_bytes("alice", "a.txt", b"new content")
+    assert not old.path.exists()
+    assert uploads.used_bytes == len(b"new content")
+
+
+async def test_quota(uploads):
+    with pytest.raises(QuotaExceededError):
+        await uploads.write_bytes("alice", "big", b"x" * 101)
+    await uploads.write_bytes("alice", "a", b"x" * 100)
+    with pytest.raises(QuotaExceededError):
+        await uploads.write_bytes("bob", "b", b"y" * 60)
+
+
+async def test_names_stay_inside_the_store(uploads):
+    stored = await uploads.write_bytes("alice", "../../etc/passwd", b"x")
+    assert stored.name == "passwd"
+    with pytest.raises(ValueError, match="Invalid"):
+        await uploads.write_bytes("..", "a", b"x")
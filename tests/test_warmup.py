@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import asyncio
+
+from chat import chat
+from chat.agents import warm_pool
+
+
+async def test_failed_warm_up_marks_the_pool_degraded(monkeypatch):
+    async def fail():
+        msg = "no provider"
+        raise RuntimeError(msg)
+
+    monkeypatch.setattr(warm_pool, "ready", False)
+    monkeypatch.setattr(warm_pool, "degraded", False)
+    task = asyncio.create_task(fail())
+    task.add_done_callback(chat._warmed_up)
+    await asyncio.gather(task, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    response = await chat.ping()
+    assert response.status_code == 200
+    assert response.body == b'"degraded"'